@@ -1,49 +1,61 @@
 # app.py - Página principal
-import sqlite3
 import streamlit as st
-from db_path import DB_PATH
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+from task_repository import get_repository
+from task_cache import (cache_tasks, current_data_version, current_db_path,
+                        current_tenant, get_task_scheduler, start_maintenance_worker,
+                        stop_if_no_task_list)
+from task_scheduler import DUE_SOON_DAYS, due_windows
+from task_snapshot import convert_task_types
 from debug import *
 
+# How far back the activity charts go
+STATS_DAYS = 30
+STATS_WEEKS = 12
+
+# Open tasks listed under "Coming up", the earliest due first
+NEXT_DUE_TASKS = 5
+
+@cache_tasks
+def load_stats(db_path, data_version, today):
+    """
+    Task totals and the per-day activity of the last STATS_WEEKS weeks.
+    Both come from tables the database keeps up to date on every write, so
+    this reads one row per day shown whatever the number of tasks.
+    """
+    repository = get_repository(db_path)
+    total, completed = repository.task_totals()
+
+    first_day = today - timedelta(weeks=STATS_WEEKS)
+    daily = repository.daily_stats(first_day.isoformat(), today.isoformat())
+    # days without activity have no row: fill them with zeros
+    daily.index = pd.to_datetime(daily.pop('day'))
+    daily = daily.reindex(pd.date_range(first_day, today, freq='D'), fill_value=0)
+    return total, completed, daily
+
+@cache_tasks
+def load_due(db_path, data_version, today):
+    """
+    How many open tasks are overdue, due today and due soon, and the next
+    NEXT_DUE_TASKS due. All of it comes from the front of the scheduler's
+    next-due queue, so no task without a due date is ever looked at.
+    """
+    scheduler = get_task_scheduler(db_path).sync()
+    counts = {view: scheduler.count_due(start, end)
+              for view, (start, end) in due_windows(today).items()}
+    next_due = get_repository(db_path).read_tasks_by_id(
+        [task_id for _, task_id in scheduler.next_due(NEXT_DUE_TASKS)])
+    next_due = convert_task_types(next_due).sort_values(['due_date', 'task_id'])
+    return counts, next_due[['task', 'due_date', 'recurrence']]
+
 # The st.toggle widget itself manages st.session_state.debug_mode
 st.toggle('Debug Mode', key='debug_mode')
 
 
-# load the database
-add_debug_message(f"DEBUG: DB_PATH used in app.py: {DB_PATH}")
-
-conn = sqlite3.connect(DB_PATH, timeout=10)
-cursor = conn.cursor()
-
-# if database does not exist, create it
-try:
-    cursor.execute('SELECT 1 FROM tasks LIMIT 1;')
-
-except:
-    create_db_query = '''
-    CREATE TABLE IF NOT EXISTS tasks (
-    task_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    task TEXT NOT NULL,
-    created_date TEXT DEFAULT CURRENT_TIMESTAMP,
-    completed_date TEXT,
-    completed INTEGER DEFAULT 0
-    )
-    '''
-
-    cursor.execute(create_db_query)
-    conn.commit()
-
-    add_debug_message(f'Database created successfully!')
-
-finally:
-    conn.close()
-
-# Initialize session state variables that need to be shared across all pages
-# This ensures they are available from the start of the user session.
-if 'data_version' not in st.session_state:
-    st.session_state.data_version = 0
-
-if 'select_all_delete' not in st.session_state:
-    st.session_state.select_all_delete = False
+# load the database of this session's tenant
+db_path = current_db_path()
+add_debug_message("DEBUG: Database used in app.py: %s", db_path)
 
 # Configurar la página
 st.set_page_config(
@@ -57,6 +69,8 @@ st.set_page_config(
 st.title("📋 TODO List - Homepage")
 
 st.write("Welcome to your personal TODO Tasks Manager!")
+if current_tenant():
+    st.caption(f"Task list: **{current_tenant()}**")
 st.markdown("""
 This application helps you manage your daily tasks efficiently. Here's what you can do:
 
@@ -68,5 +82,55 @@ This application helps you manage your daily tasks efficiently. Here's what you
 Stay organized and boost your productivity!
 """)
 
+### DASHBOARD ###
+# a tenant's list is only created by its first task
+stop_if_no_task_list("Your task list is empty. Use the ***Create tasks*** page to get started!")
+
+# The repository migrates the schema once per process, when it is first
+# created, so there is nothing to check on every rerun
+repository = get_repository(db_path)
+if repository.migrations_applied:
+    add_debug_message('Database migrated: %s', repository.migrations_applied)
+
+# Purges soft-deleted tasks and archives old completed ones in the background
+start_maintenance_worker(db_path)
+
+# the daily rollup and the due dates are by UTC day, like the stored Unix epochs
+today = datetime.now(timezone.utc).date()
+data_version = current_data_version()
+with timed('cache load'):
+    total, completed, daily = load_stats(db_path, data_version, today)
+    due_counts, next_due = load_due(db_path, data_version, today)
+
+st.subheader("⏰ Due dates")
+col1, col2, col3 = st.columns(3)
+col1.metric("Overdue", due_counts['overdue'])
+col2.metric("Due today", due_counts['today'])
+col3.metric(f"Due in the next {DUE_SOON_DAYS} days", due_counts['soon'])
+if next_due.empty:
+    st.caption("No open task has a due date. Set one on the ***Create tasks*** or ***Update tasks*** page.")
+else:
+    st.write("Coming up:")
+    st.dataframe(next_due, hide_index=True,
+                 column_config={'task': 'Task',
+                                'due_date': st.column_config.DateColumn('Due on'),
+                                'recurrence': 'Repeats'})
+
+st.subheader("📊 Your progress")
+col1, col2, col3 = st.columns(3)
+col1.metric("Open tasks", total - completed)
+col2.metric("Completed tasks", completed)
+col3.metric("Completion rate", f"{completed / total:.0%}" if total else "-")
+
+period = st.radio("Activity", ['Per day', 'Per week'], horizontal=True)
+if period == 'Per day':
+    activity = daily.iloc[-STATS_DAYS:]
+else:
+    # weeks starting on Monday
+    activity = daily.resample('W-MON', label='left', closed='left').sum()
+with timed('render'):
+    st.bar_chart(activity.rename(columns={'created': 'Created', 'completed': 'Completed'}),
+                 stack=False)
+
 # Display debug messages if debug mode is active
 show_debug_messages()
@@ -0,0 +1,330 @@
+"""
+Headless benchmark of the data paths behind the pages.
+
+Seeds temporary databases of several sizes with the create_db.py schema and
+times the operations the pages perform: loading a page or the whole table
+(query plus dtype conversion), the same on the in-memory read replica and
+many readers at once, a full-text search page, the Home statistics, the incremental snapshot sync, the
+due-date counts from the scheduler's queue and from a scan, updating edited rows (one batch
+and the old row-by-row loop), deleting a selection, creating a task, and
+many sessions creating tasks at once with and without the write queue.
+Reports p50/p99 latency and throughput, writes the
+results as JSON and compares them with a stored baseline.
+
+    python benchmarks/bench_data_paths.py                       # 1k, 100k and 1M tasks
+    python benchmarks/bench_data_paths.py --sizes 1000 100000 --save-baseline
+    python benchmarks/bench_data_paths.py --sizes 1000 100000   # fails on regressions
+
+Exits with status 1 if any operation's p50 latency is slower than the
+baseline by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from create_db import create_database
+from task_repository import TaskRepository
+from task_scheduler import RECURRENCES, TaskScheduler, due_windows
+from task_snapshot import TaskSnapshot, convert_task_types
+from write_queue import WriteQueue
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+DEFAULT_RESULTS = os.path.join(ROOT, 'benchmarks', 'results.json')
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+PAGE_SIZE = 100       # rows per page, as in the page size selector
+WRITERS = 16          # concurrent sessions creating tasks
+WRITES_PER_WRITER = 20
+READERS = 8           # concurrent sessions loading pages
+READS_PER_READER = 20
+BATCH_ROWS = 100      # rows per update / delete, like a bulk selection
+SEED_CHUNK = 10_000
+DUE_SHARE = 0.2       # pending tasks with a due date, some of them recurring
+
+
+def seed_database(path, size):
+    """Create a database with the app schema and `size` tasks."""
+    create_database(path)
+    repository = TaskRepository(path)
+    start = datetime(2024, 1, 1)
+    today = datetime.now(timezone.utc).date()
+    rng = random.Random(size)
+
+    def chunks():
+        for offset in range(0, size, SEED_CHUNK):
+            rows = []
+            for i in range(offset, min(offset + SEED_CHUNK, size)):
+                created = start + timedelta(seconds=i * 30)
+                completed = rng.random() < 0.4
+                completed_date = created + timedelta(hours=2) if completed else None
+                # due dates from a month ago to three months ahead
+                due = (today + timedelta(days=rng.randint(-30, 90))
+                       if not completed and rng.random() < DUE_SHARE else None)
+                rows.append((f'Task number {i}',
+                             created.strftime('%Y-%m-%d %H:%M:%S'),
+                             completed_date.strftime('%Y-%m-%d %H:%M:%S') if completed else None,
+                             int(completed),
+                             due.isoformat() if due else None,
+                             rng.choice(RECURRENCES) if due and rng.random() < 0.1 else None))
+            yield rows
+
+    repository.import_tasks(chunks())
+    return repository
+
+
+def measure(operation, iterations, rows_per_op=1):
+    """Run operation() `iterations` times and summarize the latencies."""
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        'iterations': iterations,
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 3),
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+        'ops_per_s': round(iterations / total, 2),
+        'rows_per_s': round(iterations * rows_per_op / total, 1),
+    }
+
+
+def run_size(size, iterations):
+    """Benchmark every operation against a fresh database of `size` tasks."""
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f'Seeding {size} tasks...', file=sys.stderr)
+        repository = seed_database(os.path.join(tmp, 'bench.db'), size)
+        results = {}
+        task_ids = list(range(1, size + 1))
+        rng = random.Random(0)
+
+        # --- reads (Read / Update / Delete page loaders) ---
+        def read_first_page():
+            df, _ = repository.read_page(PAGE_SIZE)
+            convert_task_types(df)
+        results['read_first_page'] = measure(read_first_page, iterations, PAGE_SIZE)
+
+        _, middle_cursor = repository.read_page(size // 2)
+        def read_deep_page():
+            df, _ = repository.read_page(PAGE_SIZE, middle_cursor)
+            convert_task_types(df)
+        results['read_deep_page'] = measure(read_deep_page, iterations, PAGE_SIZE)
+
+        # search box: a selective prefix query and a term matching every task
+        def search_rare():
+            df, _ = repository.read_page(PAGE_SIZE, search='"number 4242"')
+            convert_task_types(df)
+        results['search_phrase_page'] = measure(search_rare, iterations)
+
+        def search_common():
+            df, _ = repository.read_page(PAGE_SIZE, search='task')
+            convert_task_types(df)
+        results['search_common_term_page'] = measure(search_common, max(3, iterations // 10), PAGE_SIZE)
+
+        # whole table: what every loader did before pagination
+        def read_all():
+            convert_task_types(repository.read_tasks())
+        results['read_all'] = measure(read_all, max(3, iterations // 10), size)
+
+        # --- the same reads on the in-memory read replica (TODO_READ_REPLICA=1) ---
+        replica = TaskRepository(repository.db_path, read_replica=True)
+        results['replica_refresh'] = measure(replica.replica.refresh, max(3, iterations // 10), size)
+
+        def read_deep_page_replica():
+            df, _ = replica.read_page(PAGE_SIZE, middle_cursor)
+            convert_task_types(df)
+        results['read_deep_page_replica'] = measure(read_deep_page_replica, iterations, PAGE_SIZE)
+
+        # many sessions loading pages at once, from the file and from the replica
+        def fan_out(reader):
+            def read_pages():
+                for _ in range(READS_PER_READER):
+                    reader.read_page(PAGE_SIZE, middle_cursor)
+            threads = [threading.Thread(target=read_pages) for _ in range(READERS)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        reads = READERS * READS_PER_READER
+        results['concurrent_read_direct'] = measure(
+            lambda: fan_out(repository), max(3, iterations // 10), reads * PAGE_SIZE)
+        results['concurrent_read_replica'] = measure(
+            lambda: fan_out(replica), max(3, iterations // 10), reads * PAGE_SIZE)
+        replica.close()
+
+        # --- Home dashboard: running totals plus 12 weeks of daily rollup ---
+        def read_stats():
+            repository.task_totals()
+            repository.daily_stats('2024-01-01', '2024-03-25')
+        results['read_stats'] = measure(read_stats, iterations)
+
+        # --- incremental snapshot ('All' page size) after a single write ---
+        snapshot = TaskSnapshot(repository)
+        snapshot.sync()
+        def sync_after_write():
+            repository.create_task('snapshot probe')
+            snapshot.sync()
+        results['snapshot_sync_after_write'] = measure(sync_after_write, iterations)
+
+        # --- Home due-date counts: the scheduler's queue against a table scan ---
+        results['scheduler_reload'] = measure(lambda: TaskScheduler(repository).sync(),
+                                              max(3, iterations // 10), size)
+        scheduler = TaskScheduler(repository).sync()
+        windows = due_windows(datetime.now(timezone.utc).date()).values()
+        def due_counts_scheduler():
+            scheduler.sync()
+            for start, end in windows:
+                scheduler.count_due(start, end)
+        results['due_counts_scheduler'] = measure(due_counts_scheduler, iterations)
+
+        def due_counts_scan():
+            df = repository.read_tasks()
+            due = df.loc[df['completed'] == 0, 'due_date']
+            for start, end in windows:
+                ((due >= (start or 0)) & (due < end)).sum()
+        results['due_counts_scan'] = measure(due_counts_scan, max(3, iterations // 10), size)
+
+        def scheduler_sync_after_write():
+            repository.create_task('scheduler probe', int(time.time()))
+            scheduler.sync()
+        results['scheduler_sync_after_write'] = measure(scheduler_sync_after_write, iterations)
+
+        # --- updates (Update tasks button) ---
+        def update_batch():
+            ids = rng.sample(task_ids, BATCH_ROWS)
+            repository.update_tasks({i: {'task_id': task_id, 'completed': rng.random() < 0.5}
+                                     for i, task_id in enumerate(ids)})
+        results['update_batch'] = measure(update_batch, iterations, BATCH_ROWS)
+
+        # the previous implementation: one transaction per edited row
+        def update_row_by_row():
+            for task_id in rng.sample(task_ids, BATCH_ROWS):
+                repository.update_task(task_id, f'Task {task_id}', True, datetime.now())
+        results['update_row_by_row'] = measure(update_row_by_row, max(3, iterations // 10), BATCH_ROWS)
+
+        # --- create (Add task button) ---
+        results['create'] = measure(lambda: repository.create_task('Benchmark task'), iterations)
+
+        # --- many sessions adding tasks at once: own transactions vs the write queue ---
+        def concurrently(create):
+            def writer():
+                for _ in range(WRITES_PER_WRITER):
+                    create('Concurrent task')
+            threads = [threading.Thread(target=writer) for _ in range(WRITERS)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        writes = WRITERS * WRITES_PER_WRITER
+        concurrent_iterations = max(3, iterations // 10)
+        results['concurrent_create_direct'] = measure(
+            lambda: concurrently(repository.create_task), concurrent_iterations, writes)
+        write_queue = WriteQueue(repository)
+        results['concurrent_create_queued'] = measure(
+            lambda: concurrently(lambda task: write_queue.create_task(task).result()),
+            concurrent_iterations, writes)
+        write_queue.close()
+
+        # --- delete (Eliminar tareas button), through the write queue like the page ---
+        rng.shuffle(task_ids)
+        write_queue = WriteQueue(repository)
+        def delete_selection():
+            write_queue.delete_tasks([task_ids.pop() for _ in range(BATCH_ROWS)]).result()
+        # leave half of the tasks for the soft delete run below
+        delete_iterations = min(iterations, len(task_ids) // (2 * BATCH_ROWS))
+        results['delete_selection'] = measure(delete_selection, delete_iterations, BATCH_ROWS)
+
+        def soft_delete_selection():
+            write_queue.delete_tasks([task_ids.pop() for _ in range(BATCH_ROWS)], soft=True).result()
+        soft_iterations = min(iterations, len(task_ids) // BATCH_ROWS)
+        results['soft_delete_selection'] = measure(soft_delete_selection, soft_iterations, BATCH_ROWS)
+        write_queue.close()
+        results['purge_deleted'] = measure(repository.purge_deleted, 1, soft_iterations * BATCH_ROWS)
+
+        repository.close()
+        return results
+
+
+def compare(results, baseline, tolerance):
+    """Print a comparison with the baseline and return the regressions found."""
+    regressions = []
+    print(f"\n{'size':>9} {'operation':<28} {'p50 ms':>10} {'p99 ms':>10} {'rows/s':>12} {'vs baseline':>12}")
+    for size, operations in results['results'].items():
+        for name, stats in operations.items():
+            base = baseline.get('results', {}).get(size, {}).get(name) if baseline else None
+            change = ''
+            if base and base['p50_ms'] > 0:
+                ratio = stats['p50_ms'] / base['p50_ms']
+                change = f'{(ratio - 1) * 100:+.0f}%'
+                if ratio > 1 + tolerance:
+                    change += ' SLOWER'
+                    regressions.append((size, name, base['p50_ms'], stats['p50_ms']))
+            print(f"{size:>9} {name:<28} {stats['p50_ms']:>10.3f} {stats['p99_ms']:>10.3f} "
+                  f"{stats['rows_per_s']:>12.1f} {change:>12}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the task data paths.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Numbers of tasks to seed (default: 1000 100000 1000000)')
+    parser.add_argument('--iterations', type=int, default=50,
+                        help='Timed iterations per operation (default: 50)')
+    parser.add_argument('--output', default=DEFAULT_RESULTS,
+                        help='Where to write the JSON results')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='Baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed p50 slowdown before failing (default: 0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    results = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.machine(),
+            'iterations': args.iterations,
+        },
+        'results': {str(size): run_size(size, args.iterations) for size in args.sizes},
+    }
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {args.output}', file=sys.stderr)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Baseline saved to {args.baseline}', file=sys.stderr)
+    elif regressions:
+        print(f'\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:')
+        for size, name, before, after in regressions:
+            print(f'  {name} at {size} tasks: p50 {before:.3f} ms -> {after:.3f} ms')
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""
+Load test of the real pages with many concurrent sessions.
+
+Streamlit reruns the whole page script on every interaction, so the cost
+of a click is the page's script (debug toggle, loaders, data editor setup,
+...) and not only its queries. This harness drives the actual scripts
+with Streamlit's headless AppTest: every simulated session runs in its own
+thread and, round after round, opens Home, adds a task, reads the list,
+edits and saves a row, then selects all, clears the selection and deletes
+a ticked task. All sessions start together against a seeded temporary
+database, like users of one server process.
+
+    python benchmarks/load_test.py                              # 8 sessions, 5 rounds
+    python benchmarks/load_test.py --sessions 32 --rounds 10 --size 100000
+    python benchmarks/load_test.py --sessions 32 --tenants 8    # spread over 8 shards
+
+Reports per page and action the rerun latency percentiles, the errors
+shown by the pages (lock and write timeouts, and edits of tasks another
+session deleted, counted apart) and the hit ratio of every cached loader,
+and can write them as JSON. Exits with status 1 on any other error.
+"""
+import argparse
+import functools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# The sessions' task lists are tenant shards in a temporary directory
+TENANTS_DIR = tempfile.mkdtemp(prefix='todo-load-test-')
+os.environ['TODO_TENANTS_DIR'] = TENANTS_DIR
+
+from unittest.mock import MagicMock
+
+from streamlit import config
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest, app_test, local_script_runner
+
+import task_cache
+from bench_data_paths import seed_database
+from db_path import tenant_db_path
+
+HOME = os.path.join(ROOT, '1_📋_Home.py')
+CREATE = os.path.join(ROOT, 'pages', '1_➕_Create_tasks.py')
+READ = os.path.join(ROOT, 'pages', '2_📋_Read_tasks.py')
+UPDATE = os.path.join(ROOT, 'pages', '3_🔄_Update_tasks.py')
+DELETE = os.path.join(ROOT, 'pages', '4_🗑️_Delete_tasks.py')
+
+# Messages of errors caused by waiting on the database write lock
+LOCK_ERRORS = ('database is locked', 'database is busy', 'timeout', 'timed out')
+
+# Expected under concurrency: another session deleted the task being edited
+CONFLICT_ERRORS = ('does not exist',)
+
+
+### ONE RUNTIME FOR ALL SESSIONS ###
+# AppTest installs a mock runtime for each run and removes it when the run
+# ends, which breaks the runs still going on in other threads. Every
+# session gets the same mock runtime instead, as sessions share the one
+# runtime of a real server.
+_runtime = MagicMock(spec=Runtime)
+_runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage('/mock/media'))
+_runtime.cache_storage_manager = MemoryCacheStorageManager()
+Runtime.instance = classmethod(lambda cls: _runtime)
+Runtime.exists = classmethod(lambda cls: True)
+
+# Likewise one script cache: each page is compiled once, not on every run
+# of every session (compiling in many threads at once can also fail)
+_script_cache = ScriptCache()
+app_test.ScriptCache = local_script_runner.ScriptCache = lambda: _script_cache
+
+# AppTest turns this option on only while each run lasts, and runs ending in
+# other threads would turn it off in the middle of this one
+config.set_option('global.appTest', True)
+
+
+### CACHE HIT RATIOS ###
+# task_cache.cache_tasks is wrapped before any page runs: every call of a
+# loader is counted, and its body only runs (and counts a miss) when
+# st.cache_data had no entry for the arguments.
+_cache_calls = Counter()
+_cache_misses = Counter()
+_cache_lock = threading.Lock()
+_cache_tasks = task_cache.cache_tasks
+
+def _counting_cache_tasks(func):
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def on_miss(*args, **kwargs):
+        with _cache_lock:
+            _cache_misses[name] += 1
+        return func(*args, **kwargs)
+
+    # functools.wraps keeps the loader's name and source, which are what
+    # st.cache_data keys its cache on
+    cached = _cache_tasks(on_miss)
+
+    @functools.wraps(func)
+    def loader(*args, **kwargs):
+        with _cache_lock:
+            _cache_calls[name] += 1
+        return cached(*args, **kwargs)
+    return loader
+
+task_cache.cache_tasks = _counting_cache_tasks
+
+
+### ONE SIMULATED SESSION ###
+class Session:
+    """One browser session: an AppTest per page, all on the same tenant."""
+
+    def __init__(self, number, tenant, timeout):
+        self.number = number
+        self.apps = {}
+        for name, path in (('Home', HOME), ('Create', CREATE), ('Read', READ),
+                           ('Update', UPDATE), ('Delete', DELETE)):
+            app = AppTest.from_file(path, default_timeout=timeout)
+            app.query_params['tenant'] = tenant
+            self.apps[name] = app
+        self.latencies = defaultdict(list)
+        self.errors = []
+
+    def _timed(self, page, action, run):
+        start = time.perf_counter()
+        try:
+            app = run()
+        except Exception as e:
+            # the script did not finish (e.g. the AppTest timeout)
+            self.latencies[(page, action)].append(time.perf_counter() - start)
+            self.errors.append((page, action, f'{type(e).__name__}: {e}'))
+            return None
+        self.latencies[(page, action)].append(time.perf_counter() - start)
+        for exception in app.exception:
+            self.errors.append((page, action, exception.message))
+        for error in app.error:
+            self.errors.append((page, action, error.value))
+        return app
+
+    def _button(self, page, label):
+        return next((button for button in self.apps[page].button if button.label == label), None)
+
+    def _click(self, page, action, label):
+        button = self._button(page, label)
+        if button is None:
+            # the last run failed before drawing the button
+            self.errors.append((page, action, f'no {label!r} button'))
+            return None
+        return self._timed(page, action, button.click().run)
+
+    def _edit_rows(self, page, edited_rows, button):
+        """
+        Rerun page with edited_rows typed into its data editor and button
+        clicked. AppTest cannot edit a data editor, so its widget state is
+        sent along with the others, as the browser would.
+        """
+        app = self.apps[page]
+        if not app.dataframe or self._button(page, button) is None:
+            return app.run()
+        editor = app.dataframe[0]
+        self._button(page, button).click()
+        states = app._tree.get_widget_states()
+        states.widgets.append(WidgetState(
+            id=editor.proto.id,
+            string_value=json.dumps({'edited_rows': edited_rows,
+                                     'added_rows': [], 'deleted_rows': []})))
+        return app._run(states)
+
+    def round(self, round_number):
+        self._timed('Home', 'open', self.apps['Home'].run)
+
+        create = self.apps['Create']
+        if self._timed('Create', 'open', create.run):
+            create.text_input(key='task_text').set_value(
+                f'Load test task {self.number}.{round_number}')
+            self._click('Create', 'add task', 'Add task')
+
+        self._timed('Read', 'open', self.apps['Read'].run)
+
+        if self._timed('Update', 'open', self.apps['Update'].run):
+            self._timed('Update', 'edit and save',
+                        lambda: self._edit_rows('Update', {'0': {'completed': round_number % 2 == 0}},
+                                                'Update Tasks'))
+
+        if self._timed('Delete', 'open', self.apps['Delete'].run):
+            self._click('Delete', 'select all', 'Seleccionar todo')
+            self._click('Delete', 'clear selection', 'Deseleccionar todo')
+            self._timed('Delete', 'tick and delete',
+                        lambda: self._edit_rows('Delete', {'0': {'Seleccionar': True}},
+                                                'Eliminar tareas'))
+
+
+### RUN AND REPORT ###
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def run_load_test(sessions, rounds, size, tenants, timeout):
+    tenant_names = [f'load-test-{i}' for i in range(tenants)]
+    for tenant in tenant_names:
+        print(f'Seeding {size} tasks for {tenant}...', file=sys.stderr)
+        seed_database(tenant_db_path(tenant), size).close()
+
+    simulated = [Session(i, tenant_names[i % tenants], timeout) for i in range(sessions)]
+    # one warm-up pass of every page, one session at a time: st.cache_data
+    # and st.cache_resource create their caches on first use
+    for session in simulated[:tenants]:
+        for app in session.apps.values():
+            app.run()
+    _cache_calls.clear()
+    _cache_misses.clear()
+
+    start_together = threading.Barrier(sessions)
+    def run_session(session):
+        start_together.wait()
+        for round_number in range(rounds):
+            session.round(round_number)
+
+    print(f'Running {sessions} session(s) x {rounds} round(s)...', file=sys.stderr)
+    threads = [threading.Thread(target=run_session, args=(session,)) for session in simulated]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = defaultdict(list)
+    errors = []
+    for session in simulated:
+        for action, values in session.latencies.items():
+            latencies[action].extend(values)
+        errors.extend(session.errors)
+
+    actions = {}
+    for (page, action), values in latencies.items():
+        values.sort()
+        actions[f'{page}: {action}'] = {
+            'reruns': len(values),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 1),
+            'max_ms': round(values[-1] * 1000, 1),
+            'errors': sum(1 for error in errors if error[:2] == (page, action)),
+        }
+    def count_matching(texts):
+        return sum(1 for error in errors if any(text in error[2].lower() for text in texts))
+    caches = {name: {'calls': calls,
+                     'misses': _cache_misses[name],
+                     'hit_ratio': round(1 - _cache_misses[name] / calls, 3)}
+              for name, calls in sorted(_cache_calls.items())}
+    return {
+        'meta': {'sessions': sessions, 'rounds': rounds, 'size': size, 'tenants': tenants,
+                 'elapsed_s': round(elapsed, 2),
+                 'reruns_per_s': round(sum(len(v) for v in latencies.values()) / elapsed, 1)},
+        'actions': actions,
+        'errors': len(errors),
+        'lock_errors': count_matching(LOCK_ERRORS),
+        'conflicts': count_matching(CONFLICT_ERRORS),
+        'error_samples': sorted({error[2] for error in errors})[:10],
+        'caches': caches,
+    }
+
+def report(results):
+    meta = results['meta']
+    print(f"\n{meta['sessions']} session(s) x {meta['rounds']} round(s), {meta['size']} tasks "
+          f"on {meta['tenants']} shard(s): {meta['elapsed_s']} s, {meta['reruns_per_s']} reruns/s")
+    print(f"\n{'page: action':<28} {'reruns':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'max ms':>9} {'errors':>7}")
+    for name, stats in results['actions'].items():
+        print(f"{name:<28} {stats['reruns']:>7} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+              f"{stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f} {stats['errors']:>7}")
+    print(f"\nErrors: {results['errors']} ({results['lock_errors']} lock or write timeouts, "
+          f"{results['conflicts']} edits of tasks deleted by another session)")
+    for message in results['error_samples']:
+        print(f'  {message}')
+    print(f"\n{'cached loader':<28} {'calls':>7} {'misses':>7} {'hit ratio':>10}")
+    for name, stats in results['caches'].items():
+        print(f"{name:<28} {stats['calls']:>7} {stats['misses']:>7} {stats['hit_ratio']:>10.1%}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the pages with concurrent sessions.')
+    parser.add_argument('--sessions', type=int, default=8,
+                        help='Concurrent simulated sessions (default: 8)')
+    parser.add_argument('--rounds', type=int, default=5,
+                        help='Rounds of page visits per session (default: 5)')
+    parser.add_argument('--size', type=int, default=10_000,
+                        help='Tasks seeded in each shard (default: 10000)')
+    parser.add_argument('--tenants', type=int, default=1,
+                        help='Shards the sessions are spread over (default: 1, all on one)')
+    parser.add_argument('--timeout', type=float, default=60,
+                        help='Longest a single rerun may take, in seconds (default: 60)')
+    parser.add_argument('--output', help='Where to write the JSON results')
+    args = parser.parse_args(argv)
+
+    try:
+        results = run_load_test(args.sessions, args.rounds, args.size,
+                                max(1, min(args.tenants, args.sessions)), args.timeout)
+    finally:
+        shutil.rmtree(TENANTS_DIR, ignore_errors=True)
+    report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Results written to {args.output}', file=sys.stderr)
+    # edit conflicts are expected; anything else is a failure
+    return 1 if results['errors'] > results['conflicts'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
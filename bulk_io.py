@@ -0,0 +1,229 @@
+"""
+Bulk import and export of tasks as CSV, JSON Lines or Parquet.
+
+Files are streamed in chunks in both directions, so neither side ever holds
+the whole task list in memory. Usable from the Import / Export page or from
+the command line:
+
+    python bulk_io.py import tasks.csv
+    python bulk_io.py export backup.jsonl
+    python bulk_io.py export team-a.csv --tenant team-a
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from datetime import date, datetime, timezone
+
+from db_path import tenant_db_path
+from task_repository import get_repository
+from task_scheduler import RECURRENCES
+from write_queue import WRITE_TIMEOUT, get_write_queue
+
+CHUNK_SIZE = 5000
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+
+
+def detect_format(filename):
+    """Return the file format from the file extension."""
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    if extension in ('json', 'ndjson'):
+        extension = 'jsonl'
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported file type '.{extension}'. Use one of: {', '.join(FORMATS)}")
+    return extension
+
+
+### READING ###
+# Each reader takes a binary file object and yields one dict per task.
+# Text wrappers are detached afterwards so they don't close the caller's file.
+
+def _read_csv(file):
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.DictReader(text)
+    finally:
+        text.detach()
+
+def _read_jsonl(file):
+    text = io.TextIOWrapper(file, encoding='utf-8')
+    try:
+        for line in text:
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        text.detach()
+
+def _read_parquet(file):
+    # pyarrow is installed together with streamlit
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(file).iter_batches(batch_size=CHUNK_SIZE):
+        yield from batch.to_pylist()
+
+READERS = {'csv': _read_csv, 'jsonl': _read_jsonl, 'parquet': _read_parquet}
+
+
+def _to_date(record, column, line_number):
+    """
+    The date in one column of an imported record as a 'YYYY-MM-DD HH:MM:SS'
+    UTC string, or None when the column is missing or empty (empty strings
+    from CSV mean "no date").
+    """
+    value = record.get(column)
+    if value is None or value == '':
+        return None
+    try:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.strip())
+        elif not isinstance(value, date):
+            raise TypeError
+    except (TypeError, ValueError):
+        raise ValueError(f"Row {line_number}: '{column}' must be a date like 2024-12-31 "
+                         f"or 2024-12-31 18:30:00, not {value!r}") from None
+    if not isinstance(value, datetime):
+        return value.isoformat()
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(sep=' ', timespec='seconds')
+
+def _to_row(record, line_number):
+    """Turn one imported record into an INSERT parameter tuple."""
+    task = record.get('task')
+    if task is None or not str(task).strip():
+        raise ValueError(f"Row {line_number}: 'task' is missing or empty")
+
+    completed = record.get('completed')
+    if isinstance(completed, str):
+        completed = completed.strip().lower() in TRUE_VALUES
+    completed = int(bool(completed))
+
+    created_date = _to_date(record, 'created_date', line_number)
+    completed_date = _to_date(record, 'completed_date', line_number)
+    due_date = _to_date(record, 'due_date', line_number)
+    recurrence = record.get('recurrence') or None
+    if recurrence is not None and recurrence not in RECURRENCES:
+        raise ValueError(f"Row {line_number}: 'recurrence' must be one of {', '.join(RECURRENCES)}")
+    return (str(task), created_date, completed_date, completed, due_date, recurrence)
+
+def iter_chunks(file, file_format, chunk_size=CHUNK_SIZE):
+    """Yield lists of INSERT parameter tuples, chunk_size rows at a time."""
+    chunk = []
+    for line_number, record in enumerate(READERS[file_format](file), start=1):
+        chunk.append(_to_row(record, line_number))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def import_tasks(file, file_format, progress=None, write_queue=None):
+    """
+    Stream tasks from a seekable binary file object into the database.
+    The whole file is checked first: if any row is invalid, ValueError is
+    raised and nothing is inserted. The rows are then written through the
+    write queue, one queued write and one commit per chunk, so an import of
+    any size never holds the database's write lock for longer than a chunk
+    and the pages' writes go on in between. If writing a chunk fails, the
+    chunks before it stay imported. Returns the number of tasks imported.
+    """
+    for _ in iter_chunks(file, file_format):
+        pass
+    file.seek(0)
+
+    write_queue = write_queue or get_write_queue()
+    imported = 0
+    for chunk in iter_chunks(file, file_format):
+        imported += write_queue.import_tasks(chunk).result(WRITE_TIMEOUT)
+        if progress is not None:
+            progress(imported)
+    return imported
+
+
+### WRITING ###
+# Each writer takes a binary file object and the (columns, rows) chunks of
+# TaskRepository.iter_tasks() and returns the number of rows written.
+
+def _write_csv(file, chunks):
+    text = io.TextIOWrapper(file, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(text)
+    written = 0
+    for columns, rows in chunks:
+        if written == 0:
+            writer.writerow(columns)
+        writer.writerows(rows)
+        written += len(rows)
+    text.detach()
+    return written
+
+def _write_jsonl(file, chunks):
+    written = 0
+    for columns, rows in chunks:
+        lines = ''.join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n'
+                        for row in rows)
+        file.write(lines.encode('utf-8'))
+        written += len(rows)
+    return written
+
+def _write_parquet(file, chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer = None
+    written = 0
+    try:
+        for columns, rows in chunks:
+            batch = pa.RecordBatch.from_pylist([dict(zip(columns, row)) for row in rows])
+            if writer is None:
+                writer = pq.ParquetWriter(file, batch.schema)
+            writer.write_batch(batch)
+            written += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+WRITERS = {'csv': _write_csv, 'jsonl': _write_jsonl, 'parquet': _write_parquet}
+
+
+def export_tasks(file, file_format, repository=None):
+    """
+    Stream every task into a binary file object, chunk by chunk, straight
+    from a database cursor. Returns the number of tasks exported.
+    """
+    repository = repository or get_repository()
+    return WRITERS[file_format](file, repository.iter_tasks(CHUNK_SIZE))
+
+
+### COMMAND LINE ###
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk import or export tasks.')
+    parser.add_argument('action', choices=['import', 'export'])
+    parser.add_argument('path', help='File to read from or write to (.csv, .jsonl or .parquet)')
+    parser.add_argument('--format', choices=FORMATS,
+                        help='File format (default: taken from the file extension)')
+    parser.add_argument('--tenant', help="Tenant whose task list to use (default: the shared one)")
+    args = parser.parse_args(argv)
+
+    file_format = args.format or detect_format(args.path)
+    db_path = tenant_db_path(args.tenant)
+
+    if args.action == 'import':
+        def progress(count):
+            print(f'\r{count} tasks imported...', end='', file=sys.stderr, flush=True)
+
+        write_queue = get_write_queue(db_path)
+        with open(args.path, 'rb') as file:
+            count = import_tasks(file, file_format, progress, write_queue)
+        write_queue.close()
+        print(f'\nImported {count} tasks from {args.path}')
+    else:
+        with open(args.path, 'wb') as file:
+            count = export_tasks(file, file_format, get_repository(db_path))
+        print(f'Exported {count} tasks to {args.path}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2 @@
+# Lets `pytest` import the app's modules (task_repository, migrations, ...)
+# from the repository root, like `python -m pytest` does.
@@ -1,24 +1,21 @@
+import os
 import sqlite3
+from db_path import DB_PATH
+from migrations import migrate
 
-database = 'tasks.db'
+def create_database(database=DB_PATH):
+    """
+    Create the database (or upgrade an existing one) with the same
+    migrations the app runs at startup. Returns the migrations applied.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(database)), exist_ok=True)
+    conn = sqlite3.connect(database)
+    try:
+        return migrate(conn)
+    finally:
+        conn.close()
 
-conn = sqlite3.connect('tasks.db')
-cursor = conn.cursor()
-
-create_db_query = '''
-CREATE TABLE IF NOT EXISTS tasks (
-    task_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    task TEXT NOT NULL,
-    creation_date TEXT DEFAULT CURRENT_TIMESTAMP,
-    completed_date TEXT,
-    completed INTEGER DEFAULT 0
-)
-'''
-
-cursor.execute(create_db_query)
-
-conn.commit()
-
-conn.close()
-
-print(f'{database} created successfully!')
\ No newline at end of file
+if __name__ == '__main__':
+    applied = create_database()
+    print(f'{DB_PATH} created successfully!')
+    print(f'Applied migrations: {applied if applied else "none, already up to date"}')
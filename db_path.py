@@ -1,4 +1,37 @@
 import os
+import re
 
 # Define the absolute path to the database, assuming it's in the project root
 DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), 'tasks.db'))
+
+### TENANT SHARDS ###
+# Each tenant (a user or a team) has its own task list in its own SQLite
+# file, so tenants never share a table or a write lock. Sessions without a
+# tenant keep using DB_PATH. Point TODO_TENANTS_DIR at another directory
+# (e.g. a volume mounted on the node serving those tenants) to move the shards.
+TENANTS_DIR = os.path.abspath(os.environ.get(
+    'TODO_TENANTS_DIR', os.path.join(os.path.dirname(__file__), 'tenants')))
+
+# Tenant names become file names: keep them to a safe, short alphabet
+TENANT_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+# Tenant shards kept open at once by a process (connections, write queue,
+# maintenance worker, caches). Beyond that, the least recently used ones
+# are closed, once unused for SHARD_IDLE_SECONDS: a shard still being read
+# or written is never closed under its users, so busy shards can briefly
+# outnumber the limit.
+MAX_OPEN_SHARDS = int(os.environ.get('TODO_MAX_OPEN_SHARDS', 32))
+SHARD_IDLE_SECONDS = 60
+
+def tenant_db_path(tenant=None):
+    """
+    Path of the database shard of a tenant (DB_PATH for no tenant).
+    Raises ValueError for a name that is not a valid tenant name. The file
+    itself is only created when the shard is first opened for writing.
+    """
+    if not tenant:
+        return DB_PATH
+    if not TENANT_NAME.match(tenant):
+        raise ValueError(f'invalid tenant name {tenant!r}')
+    # case-insensitive, so 'Team-A' and 'team-a' share one list on every file system
+    return os.path.join(TENANTS_DIR, f'{tenant.lower()}.db')
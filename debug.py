@@ -1,24 +1,91 @@
+import time
+from collections import deque
 from datetime import datetime
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
-# Initialize debug mode toggle state
-if 'debug_mode' not in st.session_state:
-    st.session_state['debug_mode'] = False
+# Only the newest messages are kept if they are not displayed for a while
+MAX_DEBUG_MESSAGES = 200
 
-# Initialize a list in session state to store debug messages
-if 'debug_messages' not in st.session_state:
-    st.session_state['debug_messages'] = []
+# Timing spans kept per rerun (a page with many DB calls stays well below this)
+MAX_TIMING_SPANS = 100
+
+### Debug mode is off unless the 'Debug Mode' toggle is on ###
+def debug_enabled():
+    # Outside a Streamlit script run (command line tools, benchmarks,
+    # background threads) there is no session state and debugging is off.
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return False
+    return st.session_state.get('debug_mode', False)
+
+def _buffer(name, maxlen):
+    # bounded ring buffers: the oldest entries are dropped when they are full
+    if name not in st.session_state:
+        st.session_state[name] = deque(maxlen=maxlen)
+    return st.session_state[name]
 
 ### function to generate a debug message with current timestamp
-def add_debug_message(message):
-    if st.session_state.debug_mode:
-        st.session_state['debug_messages'] \
-        .append(f"{datetime.now().strftime('%Y-%m-%d - %H:%M:%S')} - {message}")
+def add_debug_message(message, *args):
+    """
+    Record a debug message if debug mode is on.
+    Pass values as %-style arguments instead of building an f-string, e.g.
+    add_debug_message("DEBUG: Selected task IDs: %s", ids), so that nothing
+    is formatted when debug mode is off.
+    """
+    if not debug_enabled():
+        return
+    if args:
+        message = message % args
+    _buffer('debug_messages', MAX_DEBUG_MESSAGES) \
+    .append(f"{datetime.now().strftime('%Y-%m-%d - %H:%M:%S')} - {message}")
+
+### Timing spans ###
+class _Span:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed_ms = (time.perf_counter() - self.start) * 1000
+        _buffer('debug_timings', MAX_TIMING_SPANS).append((self.name, elapsed_ms))
+        return False
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+def timed(name):
+    """
+    Context manager that records how long its block took, e.g.
+    `with timed('query'):`. When debug mode is off it returns a shared
+    no-op object, so the only cost is the debug mode check.
+    """
+    return _Span(name) if debug_enabled() else _NO_SPAN
 
 def show_debug_messages():
     # Debugging messages expander
-    if st.session_state.debug_mode:
-        with st.expander("Debug Messages"):
-            for msg in st.session_state['debug_messages']:
-                st.info(msg)
-            st.session_state['debug_messages'] = [] # Clear messages after displaying
\ No newline at end of file
+    if not debug_enabled():
+        return
+    messages = _buffer('debug_messages', MAX_DEBUG_MESSAGES)
+    timings = _buffer('debug_timings', MAX_TIMING_SPANS)
+    with st.expander("Debug Messages"):
+        if timings:
+            st.markdown('**Timings for this rerun (ms)**')
+            st.dataframe([{'span': name, 'ms': round(ms, 2)} for name, ms in timings],
+                         hide_index=True)
+            st.caption(f'Total measured: {sum(ms for _, ms in timings):.2f} ms')
+
+        for msg in messages:
+            st.info(msg)
+
+    # Clear messages and timings after displaying
+    messages.clear()
+    timings.clear()
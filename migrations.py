@@ -0,0 +1,445 @@
+import sqlite3
+
+### SCHEMA MIGRATIONS ###
+# The schema version lives in SQLite's own PRAGMA user_version, so no extra
+# table is needed. Each migration moves the database from version N-1 to N and
+# runs in its own transaction together with the version bump, so a failed
+# migration leaves the database at the previous version.
+# To change the schema, append a new function to MIGRATIONS; never edit one
+# that has already shipped.
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+def _001_create_tasks(conn):
+    """Create the tasks table (and fix databases created by the old create_db.py)."""
+    # create_db.py used to name the column creation_date while the app
+    # always queried created_date
+    if 'creation_date' in _columns(conn, 'tasks'):
+        conn.execute('ALTER TABLE tasks RENAME COLUMN creation_date TO created_date')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS tasks (
+        task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        task TEXT NOT NULL,
+        created_date TEXT DEFAULT CURRENT_TIMESTAMP,
+        completed_date TEXT,
+        completed INTEGER DEFAULT 0
+    )
+    ''')
+
+def _002_add_sort_and_status_indexes(conn):
+    """Index the default sort order and the completed/pending filter."""
+    # task_id is the rowid, which SQLite appends to every index entry, so
+    # scanning these ascending indexes backwards already yields
+    # ORDER BY created_date DESC, task_id DESC without a sort step, and
+    # status counts are answered from the index alone.
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_tasks_created_date
+    ON tasks (created_date)
+    ''')
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_tasks_completed_created_date
+    ON tasks (completed, created_date)
+    ''')
+
+def _003_add_data_version_counter(conn):
+    """Keep a change counter that every write to tasks bumps, for cache invalidation."""
+    # A single-row table read with one primary key lookup per rerun.
+    # Triggers keep it current for every writer: the app, create_db.py or any
+    # external tool, so all sessions see the same version.
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS data_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)')
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_{event.lower()}_data_version
+        AFTER {event} ON tasks
+        BEGIN
+            UPDATE data_version SET version = version + 1 WHERE id = 1;
+        END
+        ''')
+
+def _004_add_task_change_log(conn):
+    """Log the task_id of every changed row, for incremental snapshot sync."""
+    # Readers remember the last change_id they applied (their high-water mark)
+    # and only re-read the tasks logged after it. Deleted rows are detected
+    # because their task_id is logged but no longer found in tasks.
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS task_changes (
+        change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        task_id INTEGER NOT NULL
+    )
+    ''')
+    for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+        conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_{event.lower()}_change_log
+        AFTER {event} ON tasks
+        BEGIN
+            INSERT INTO task_changes (task_id) VALUES ({row}.task_id);
+        END
+        ''')
+
+def _005_add_soft_delete(conn):
+    """Let tasks be marked deleted instantly and purged later in the background."""
+    # deleted_at is NULL for live tasks. Every query the pages run filters on
+    # deleted_at IS NULL, so the sort/status indexes become partial indexes
+    # over live tasks only, plus a small index to find rows to purge.
+    conn.execute('ALTER TABLE tasks ADD COLUMN deleted_at TEXT')
+
+    conn.execute('DROP INDEX IF EXISTS idx_tasks_created_date')
+    conn.execute('DROP INDEX IF EXISTS idx_tasks_completed_created_date')
+    conn.execute('''
+    CREATE INDEX idx_tasks_created_date
+    ON tasks (created_date) WHERE deleted_at IS NULL
+    ''')
+    conn.execute('''
+    CREATE INDEX idx_tasks_completed_created_date
+    ON tasks (completed, created_date) WHERE deleted_at IS NULL
+    ''')
+    conn.execute('''
+    CREATE INDEX idx_tasks_deleted_at
+    ON tasks (deleted_at) WHERE deleted_at IS NOT NULL
+    ''')
+
+    # A soft delete is an UPDATE, which already bumps the version and logs the
+    # change. Purging rows that are already soft-deleted changes nothing the
+    # pages can see, so it must not invalidate every cache.
+    conn.execute('DROP TRIGGER IF EXISTS trg_tasks_delete_data_version')
+    conn.execute('DROP TRIGGER IF EXISTS trg_tasks_delete_change_log')
+    conn.execute('''
+    CREATE TRIGGER trg_tasks_delete_data_version
+    AFTER DELETE ON tasks WHEN OLD.deleted_at IS NULL
+    BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER trg_tasks_delete_change_log
+    AFTER DELETE ON tasks WHEN OLD.deleted_at IS NULL
+    BEGIN
+        INSERT INTO task_changes (task_id) VALUES (OLD.task_id);
+    END
+    ''')
+
+def _006_add_task_search(conn):
+    """Full-text index over task descriptions for the search box."""
+    # An external-content FTS5 table: it stores only the index and reads the
+    # text from tasks, so descriptions are not stored twice. Accents are
+    # folded ('cafe' finds 'café'). Soft-deleted rows stay indexed until they
+    # are purged; searches join back to tasks and skip them there.
+    conn.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        task,
+        content='tasks',
+        content_rowid='task_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_insert_fts
+    AFTER INSERT ON tasks
+    BEGIN
+        INSERT INTO tasks_fts (rowid, task) VALUES (NEW.task_id, NEW.task);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_delete_fts
+    AFTER DELETE ON tasks
+    BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, task) VALUES ('delete', OLD.task_id, OLD.task);
+    END
+    ''')
+    # only description edits touch the index, not status changes
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_update_fts
+    AFTER UPDATE OF task ON tasks
+    BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, task) VALUES ('delete', OLD.task_id, OLD.task);
+        INSERT INTO tasks_fts (rowid, task) VALUES (NEW.task_id, NEW.task);
+    END
+    ''')
+    # index the tasks that already exist
+    conn.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+def _stats_contribution(row, sign, day):
+    # Statements adding (sign = +1) or removing (sign = -1) one row's
+    # contribution to the statistics; day(column) is the SQL for its day
+    return f'''
+        UPDATE task_totals
+        SET total = total + {sign},
+            completed = completed + {sign} * ({row}.completed != 0)
+        WHERE id = 1 AND {row}.deleted_at IS NULL;
+        INSERT INTO task_stats_daily (day, created)
+        SELECT {day(f'{row}.created_date')}, {sign}
+        WHERE {row}.deleted_at IS NULL AND {day(f'{row}.created_date')} IS NOT NULL
+        ON CONFLICT (day) DO UPDATE SET created = created + excluded.created;
+        INSERT INTO task_stats_daily (day, completed)
+        SELECT {day(f'{row}.completed_date')}, {sign}
+        WHERE {row}.deleted_at IS NULL AND {row}.completed != 0
+          AND {day(f'{row}.completed_date')} IS NOT NULL
+        ON CONFLICT (day) DO UPDATE SET completed = completed + excluded.completed;
+        '''
+
+def _create_stats_triggers(conn, day=lambda column: f'date({column})'):
+    """Create the triggers that keep task_totals and task_stats_daily current."""
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_insert_stats
+    AFTER INSERT ON tasks
+    BEGIN
+        {_stats_contribution('NEW', 1, day)}
+    END
+    ''')
+    # purging rows that are already soft-deleted changes nothing
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_delete_stats
+    AFTER DELETE ON tasks WHEN OLD.deleted_at IS NULL
+    BEGIN
+        {_stats_contribution('OLD', -1, day)}
+    END
+    ''')
+    # description edits leave the statistics alone
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_update_stats
+    AFTER UPDATE OF created_date, completed_date, completed, deleted_at ON tasks
+    WHEN OLD.created_date IS NOT NEW.created_date
+      OR OLD.completed_date IS NOT NEW.completed_date
+      OR OLD.completed IS NOT NEW.completed
+      OR OLD.deleted_at IS NOT NEW.deleted_at
+    BEGIN
+        {_stats_contribution('OLD', -1, day)}
+        {_stats_contribution('NEW', 1, day)}
+    END
+    ''')
+
+def _007_add_task_stats(conn):
+    """Keep running task totals and a per-day rollup for the Home dashboard."""
+    # Triggers add each live task's contribution when it appears and take it
+    # back when it changes, is soft-deleted or deleted, so the dashboard reads
+    # one row plus one row per day shown instead of aggregating the table.
+    # Days are the date part of created_date / completed_date; tasks with no
+    # parseable date still count in the totals.
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS task_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total INTEGER NOT NULL,
+        completed INTEGER NOT NULL
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS task_stats_daily (
+        day TEXT PRIMARY KEY,
+        created INTEGER NOT NULL DEFAULT 0,
+        completed INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''')
+
+    # Backfill from the existing tasks
+    conn.execute('''
+    INSERT OR REPLACE INTO task_totals (id, total, completed)
+    SELECT 1, COUNT(*), COALESCE(SUM(completed != 0), 0)
+    FROM tasks WHERE deleted_at IS NULL
+    ''')
+    conn.execute('''
+    INSERT INTO task_stats_daily (day, created)
+    SELECT date(created_date), COUNT(*) FROM tasks
+    WHERE deleted_at IS NULL AND date(created_date) IS NOT NULL
+    GROUP BY 1
+    ''')
+    conn.execute('''
+    INSERT INTO task_stats_daily (day, completed)
+    SELECT date(completed_date), COUNT(*) FROM tasks
+    WHERE deleted_at IS NULL AND completed != 0 AND date(completed_date) IS NOT NULL
+    GROUP BY 1
+    ON CONFLICT (day) DO UPDATE SET completed = excluded.completed
+    ''')
+
+    _create_stats_triggers(conn)
+
+def _epoch_day(column):
+    # 'YYYY-MM-DD' (UTC) of an epoch column, for the daily statistics
+    return f"date({column}, 'unixepoch')"
+
+def _008_store_dates_as_unix_epochs(conn):
+    """Store created_date, completed_date and deleted_at as integer Unix epochs."""
+    # Integers are smaller than 'YYYY-MM-DD HH:MM:SS' strings, compare faster
+    # in the sort index and load straight into datetime64 without parsing.
+    # SQLite cannot change a column's type, so the table is rebuilt: copy the
+    # rows into a new table, swap it in, then recreate the indexes and the
+    # triggers that were dropped with the old table.
+    # Dates that cannot be parsed become NULL.
+    triggers = [sql for name, sql in conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'tasks'")
+        if not name.endswith('_stats')]
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'tasks'").fetchone()
+
+    conn.execute('''
+    CREATE TABLE tasks_new (
+        task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        task TEXT NOT NULL,
+        created_date INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+        completed_date INTEGER,
+        completed INTEGER DEFAULT 0,
+        deleted_at INTEGER
+    )
+    ''')
+    conn.execute('''
+    INSERT INTO tasks_new (task_id, task, created_date, completed_date, completed, deleted_at)
+    SELECT task_id, task,
+           CAST(strftime('%s', created_date) AS INTEGER),
+           CAST(strftime('%s', completed_date) AS INTEGER),
+           completed,
+           CAST(strftime('%s', deleted_at) AS INTEGER)
+    FROM tasks
+    ''')
+    conn.execute('DROP TABLE tasks')
+    conn.execute('ALTER TABLE tasks_new RENAME TO tasks')
+    # keep AUTOINCREMENT from reusing the ids of deleted tasks
+    if sequence is not None:
+        conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'tasks'", sequence)
+
+    conn.execute('''
+    CREATE INDEX idx_tasks_created_date
+    ON tasks (created_date) WHERE deleted_at IS NULL
+    ''')
+    conn.execute('''
+    CREATE INDEX idx_tasks_completed_created_date
+    ON tasks (completed, created_date) WHERE deleted_at IS NULL
+    ''')
+    conn.execute('''
+    CREATE INDEX idx_tasks_deleted_at
+    ON tasks (deleted_at) WHERE deleted_at IS NOT NULL
+    ''')
+    for sql in triggers:
+        conn.execute(sql)
+    # the daily rollup keeps its 'YYYY-MM-DD' days, now taken from epochs
+    _create_stats_triggers(conn, day=_epoch_day)
+
+def _009_add_task_archive(conn):
+    """Archive table for old completed tasks, moved out of the hot tasks table."""
+    # Archived tasks keep their task_id. The archive job copies a batch of
+    # tasks here and deletes them from tasks in the same transaction, so the
+    # pages' queries, indexes and snapshots only ever deal with the hot set.
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS tasks_archive (
+        task_id INTEGER PRIMARY KEY,
+        task TEXT NOT NULL,
+        created_date INTEGER,
+        completed_date INTEGER,
+        completed INTEGER,
+        archived_at INTEGER NOT NULL
+    )
+    ''')
+    # the archived history view pages by creation date, like the pages
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_tasks_archive_created_date
+    ON tasks_archive (created_date)
+    ''')
+    # finds the completed tasks old enough to be archived, oldest first
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_tasks_completed_completed_date
+    ON tasks (completed, completed_date) WHERE deleted_at IS NULL
+    ''')
+
+    # Archived tasks still count in the statistics: a delete only takes a
+    # task's contribution back if the task was not just copied to the archive.
+    conn.execute('DROP TRIGGER IF EXISTS trg_tasks_delete_stats')
+    conn.execute(f'''
+    CREATE TRIGGER trg_tasks_delete_stats
+    AFTER DELETE ON tasks
+    WHEN OLD.deleted_at IS NULL
+     AND NOT EXISTS (SELECT 1 FROM tasks_archive WHERE task_id = OLD.task_id)
+    BEGIN
+        {_stats_contribution('OLD', -1, _epoch_day)}
+    END
+    ''')
+
+def _010_add_filter_and_sort_indexes(conn):
+    """Index the other sort orders and date filters the pages offer."""
+    # Sorting by completion date or by task name (case-insensitive) then reads
+    # a page straight from an index, and completion-date ranges without a
+    # status filter are index searches.
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_tasks_completed_date
+    ON tasks (completed_date) WHERE deleted_at IS NULL
+    ''')
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_tasks_task
+    ON tasks (task COLLATE NOCASE) WHERE deleted_at IS NULL
+    ''')
+
+def _011_add_due_dates(conn):
+    """Due dates and recurrence, with the indexes the due-date views and jobs search."""
+    # due_date is the Unix epoch of the day (midnight UTC) the task is due.
+    # recurrence is NULL for one-off tasks; a completed recurring task is
+    # renewed as a new task due one period later, and loses its recurrence.
+    conn.execute('ALTER TABLE tasks ADD COLUMN due_date INTEGER')
+    conn.execute('''
+    ALTER TABLE tasks ADD COLUMN recurrence TEXT
+    CHECK (recurrence IN ('daily', 'weekly', 'monthly'))
+    ''')
+    # archived tasks keep their due date, so the archive reads the same columns
+    conn.execute('ALTER TABLE tasks_archive ADD COLUMN due_date INTEGER')
+    conn.execute('ALTER TABLE tasks_archive ADD COLUMN recurrence TEXT')
+    # only tasks with a due date are indexed, open ones first in due order
+    # (led by completed so the planner picks it over the status indexes)
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_tasks_due_date
+    ON tasks (completed, due_date)
+    WHERE deleted_at IS NULL AND due_date IS NOT NULL
+    ''')
+    # the completed recurring tasks waiting to be renewed
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_tasks_recurring_completed
+    ON tasks (completed)
+    WHERE deleted_at IS NULL AND recurrence IS NOT NULL
+    ''')
+
+MIGRATIONS = [
+    _001_create_tasks,
+    _002_add_sort_and_status_indexes,
+    _003_add_data_version_counter,
+    _004_add_task_change_log,
+    _005_add_soft_delete,
+    _006_add_task_search,
+    _007_add_task_stats,
+    _008_store_dates_as_unix_epochs,
+    _009_add_task_archive,
+    _010_add_filter_and_sort_indexes,
+    _011_add_due_dates,
+]
+
+LATEST_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn):
+    """
+    Bring the database up to LATEST_VERSION.
+    Returns the list of migration names that were applied.
+    """
+    applied = []
+    while schema_version(conn) < LATEST_VERSION:
+        # BEGIN IMMEDIATE takes the write lock first, so two processes
+        # starting at the same time cannot both run the same migration
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = schema_version(conn)
+            if version >= LATEST_VERSION:
+                conn.rollback()
+                break
+            migration = MIGRATIONS[version]
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {version + 1}')
+            conn.commit()
+            applied.append(migration.__name__)
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+    return applied
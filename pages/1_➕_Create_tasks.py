@@ -1,58 +1,74 @@
-import sqlite3
 import streamlit as st
-from time import sleep
-from db_path import DB_PATH
+from write_queue import WRITE_TIMEOUT
+from task_cache import current_write_queue
+from task_scheduler import RECURRENCES
 from debug import *
 
-if 'success_addition' not in st.session_state.keys():
-    st.session_state['success_addition'] = False
-
-if 'data_version' not in st.session_state.keys():
-    st.session_state['data_version'] = 0
+# Number of tasks added by the last click, shown once on the next run
+if 'tasks_added' not in st.session_state.keys():
+    st.session_state['tasks_added'] = 0
 
 st.toggle('Debug Mode', key='debug_mode')
 
-def create_task(task):
-    add_debug_message(f"DEBUG: create_task function called with task: '{task}'")
-    conn = sqlite3.connect(DB_PATH, timeout=10)
-    add_debug_message(f"DEBUG: Database connection opened for creating task.")
-    cursor = conn.cursor()
+# Both handlers run as button callbacks, before the script reruns, so the
+# new tasks and the cleared inputs are already in place when the page is drawn.
+# There is no need to sleep or call st.rerun().
 
+def create_task():
+    task = st.session_state['task_text'].strip()
+    add_debug_message("DEBUG: create_task function called with task: '%s'", task)
+    if not task:
+        st.session_state['tasks_added'] = 0
+        return
     try:
-        create_task_query = '''
-        INSERT INTO tasks (task) VALUES (?)
-        '''
-        add_debug_message(f"DEBUG: Executing INSERT query: {create_task_query} with param: ('{task}',)")
-
-        # Parameters must be passed as a tuple, even for a single value
-        cursor.execute(create_task_query, (task,))
-
-        # Commit the transaction to save the changes
-        conn.commit()
-        st.session_state['success_addition'] = True
-        add_debug_message(f"DEBUG: Task '{task}' added successfully and committed.")
+        task_id = current_write_queue().create_task(task,
+                                                    st.session_state['task_due_date'],
+                                                    st.session_state['task_recurrence']).result(WRITE_TIMEOUT)
+        st.session_state['tasks_added'] = 1
+        add_debug_message("DEBUG: Task '%s' added successfully with task_id %s.", task, task_id)
     except Exception as e:
-        add_debug_message(f"ERROR: Error creating task '{task}': {e}")
+        add_debug_message("ERROR: Error creating task '%s': %s", task, e)
         st.error(f"Error adding task: {e}")
     finally:
-        # Ensure the connection is closed even if an error occurs
-        conn.close()
         st.session_state['task_text'] = ""
-        add_debug_message(f"DEBUG: Database connection closed for creating task.")
+        st.session_state['task_due_date'] = None
+        st.session_state['task_recurrence'] = None
+
+def create_tasks_from_lines():
+    # one task per non-empty line
+    tasks = [line.strip() for line in st.session_state['quick_add_text'].splitlines()
+             if line.strip()]
+    add_debug_message("DEBUG: create_tasks_from_lines called with %s task(s)", len(tasks))
+    if not tasks:
+        st.session_state['tasks_added'] = 0
+        return
+    try:
+        st.session_state['tasks_added'] = current_write_queue().create_tasks(tasks).result(WRITE_TIMEOUT)
+        st.session_state['quick_add_text'] = ""
+        add_debug_message("DEBUG: %s task(s) added in one write.", len(tasks))
+    except Exception as e:
+        add_debug_message("ERROR: Error creating tasks: %s", e)
+        st.error(f"Error adding tasks: {e}")
 
 st.header('Add a task to your list')
 
-task = st.text_input('Create a new task', key = "task_text")
-
-if st.button('Add task', on_click=create_task, args = (task,)):
-    add_debug_message(f"DEBUG: 'Add task' button clicked.")
-    if st.session_state['success_addition']:
-        st.success('Task successfully added to your list!')
-        st.session_state['success_addition'] = False
-        st.session_state['data_version'] += 1
-        add_debug_message(f"DEBUG: data_version incremented to {st.session_state['data_version']}.")
-    sleep(1)
-    st.rerun()
-    add_debug_message(f"DEBUG: st.rerun() called after task addition.")
+st.text_input('Create a new task', key = "task_text")
+col1, col2 = st.columns(2)
+col1.date_input('Due date (optional)', value=None, key='task_due_date')
+# a recurring task comes back, due one period later, once it is completed
+col2.selectbox('Repeats', [None, *RECURRENCES], key='task_recurrence',
+               format_func=lambda recurrence: 'Never' if recurrence is None else recurrence.capitalize())
+st.button('Add task', on_click=create_task)
+
+with st.expander('Quick add: several tasks at once'):
+    st.text_area('One task per line', key='quick_add_text', height=150)
+    st.button('Add all tasks', on_click=create_tasks_from_lines)
+
+if st.session_state['tasks_added']:
+    if st.session_state['tasks_added'] == 1:
+        st.toast('Task successfully added to your list!', icon='✅')
+    else:
+        st.toast(f"{st.session_state['tasks_added']} tasks successfully added to your list!", icon='✅')
+    st.session_state['tasks_added'] = 0
 
 show_debug_messages()
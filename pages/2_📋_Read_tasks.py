@@ -1,58 +1,145 @@
-import sqlite3
 import streamlit as st
 from streamlit import column_config
 import pandas as pd
-from db_path import DB_PATH
+from datetime import datetime, timezone
+from task_repository import DEFAULT_FILTER, get_repository
+from pagination import *
+from task_filters import filter_controls
+from task_cache import (cache_tasks, current_data_version, current_db_path,
+                        get_task_scheduler, load_all_tasks, stop_if_no_task_list)
+from task_scheduler import DUE_SOON_DAYS, due_windows
+from task_snapshot import convert_task_types
 from debug import *
 
-if 'data_version' not in st.session_state:
-    st.session_state.data_version = 0
+# Views of the open tasks by due date, next to the whole list
+DUE_VIEWS = {
+    'all': 'All tasks',
+    'overdue': 'Overdue',
+    'today': 'Due today',
+    'soon': f'Due in the next {DUE_SOON_DAYS} days',
+}
 
-@st.cache_data
-def read_tasks(data_version):
-    conn = sqlite3.connect(DB_PATH, timeout=10)
+@cache_tasks
+def read_tasks(db_path, data_version, page_size, cursor, search, task_filter):
+    """
+    Reads one page of tasks starting at cursor, only those matching the
+    search text if there is one (best matches first) and the filter, in the
+    filter's order.
+    Returns the page DataFrame and the cursor of the next page.
+    """
     try:
-        # Use pandas to read the SQL query directly into a DataFrame
-        tasks_df = pd.read_sql_query("SELECT * FROM tasks ORDER BY created_date DESC", conn)
+        # The repository reads the page straight into a DataFrame
+        tasks_df, next_cursor = get_repository(db_path).read_page(page_size, cursor, search, task_filter)
         
         # --- FIX: Convert columns to the correct data types ---
-        # Convert the 'completed' column from 0/1 to boolean True/False
-        tasks_df['completed'] = tasks_df['completed'].astype(bool)
-        # Convert date-like strings to actual datetime objects for the data editor
-        tasks_df['created_date'] = pd.to_datetime(tasks_df['created_date'])
-        tasks_df['completed_date'] = pd.to_datetime(tasks_df['completed_date'], errors='coerce') # 'coerce' handles NULLs gracefully
+        # completed 0/1 to bool and date strings to datetimes (NULLs become NaT)
+        tasks_df = convert_task_types(tasks_df)
         
         # hide task_id column
         tasks_df.drop('task_id', axis=1, inplace=True)
 
-        return tasks_df
+        return tasks_df, next_cursor
     except Exception as e:
         print(e)
         st.warning('Failed to read tasks from the database.')
-        return pd.DataFrame() # Return an empty DataFrame on error
-    finally:
-        conn.close()
+        return pd.DataFrame(), None # Return an empty DataFrame on error
+
+@cache_tasks
+def read_due_tasks(db_path, data_version, start, end, page_size, cursor):
+    """
+    One page of the open tasks due in [start, end), earliest first, taken
+    from the scheduler's next-due queue instead of a scan of the table.
+    cursor is the (due_date, task_id) of the previous page's last task.
+    Returns the page DataFrame and the cursor of the next page.
+    """
+    due = get_task_scheduler(db_path).sync().due(
+        start, end, None if page_size is None else page_size + 1, cursor)
+    next_cursor = None
+    if page_size is not None and len(due) > page_size:
+        due = due[:page_size]
+        next_cursor = due[-1]
+    tasks_df = convert_task_types(get_repository(db_path).read_tasks_by_id(
+        [task_id for _, task_id in due]))
+    tasks_df = tasks_df.sort_values(['due_date', 'task_id'], ignore_index=True)
+    tasks_df.drop('task_id', axis=1, inplace=True)
+    return tasks_df, next_cursor
+
+@cache_tasks
+def read_archived_tasks(db_path, data_version, page_size, cursor):
+    """One page of archived tasks (completed long ago), newest first."""
+    tasks_df, next_cursor = get_repository(db_path).read_archive_page(page_size, cursor)
+    tasks_df = convert_task_types(tasks_df)
+    tasks_df.drop('task_id', axis=1, inplace=True)
+    return tasks_df, next_cursor
 
 st.toggle('Debug mode', key='debug_mode')
 
 st.header('Your List of Tasks')
+stop_if_no_task_list("Your task list is empty. Use the 'Add a task' page to get started!")
 
-tasks_df = read_tasks(st.session_state.data_version)
+# Completed tasks are archived after a while; their history is opt-in
+show_archived = st.toggle('Show archived tasks', key='read_show_archived',
+                          on_change=reset_pages, args=('read_tasks',))
 
-add_debug_message(f'DEBUG:   Tasks list retrieved from db')
-add_debug_message(f'DEBUG:   Database file loaded from {DB_PATH}')
+# Due dates are days in UTC, like the stored epochs
+view = 'all' if show_archived else st.radio('Show', list(DUE_VIEWS), format_func=DUE_VIEWS.get,
+                                            horizontal=True, key='read_due_view',
+                                            on_change=reset_pages, args=('read_tasks',))
+search = '' if show_archived or view != 'all' else search_box('read_tasks')
+task_filter = DEFAULT_FILTER if show_archived or view != 'all' else filter_controls('read_tasks')
+page_size = page_size_selector('read_tasks')
+with timed('cache load'):
+    if view != 'all':
+        start, end = due_windows(datetime.now(timezone.utc).date())[view]
+        tasks_df, next_cursor = read_due_tasks(current_db_path(), current_data_version(),
+                                               start, end,
+                                               None if page_size == ALL_TASKS else page_size,
+                                               current_cursor('read_tasks'))
+    elif show_archived:
+        tasks_df, next_cursor = read_archived_tasks(current_db_path(), current_data_version(),
+                                                    None if page_size == ALL_TASKS else page_size,
+                                                    current_cursor('read_tasks'))
+    elif page_size == ALL_TASKS and not search and task_filter.is_default:
+        # the whole table, patched incrementally instead of reloaded
+        tasks_df, next_cursor = load_all_tasks().drop(columns='task_id'), None
+    else:
+        tasks_df, next_cursor = read_tasks(current_db_path(), current_data_version(),
+                                           None if page_size == ALL_TASKS else page_size,
+                                           current_cursor('read_tasks'),
+                                           search,
+                                           task_filter)
+
+add_debug_message('DEBUG:   Tasks list retrieved from db')
+add_debug_message('DEBUG:   Database file loaded from %s', current_db_path())
 
 cfg = dict.fromkeys(tasks_df.columns)
 cfg = {i: column_config.Column(width=None) for i in cfg.keys()}
+# due dates are days
+cfg['due_date'] = column_config.DateColumn(width=None)
 
 if not tasks_df.empty:
     # Mostrar la tabla
-    st.dataframe(tasks_df,
-    column_config=cfg,
-    width='content',  # Auto-ajuste al contenedor (default)
-    hide_index=True
-)
-    
+    with timed('render'):
+        st.dataframe(tasks_df,
+        column_config=cfg,
+        width='content',  # Auto-ajuste al contenedor (default)
+        hide_index=True
+    )
+    page_controls('read_tasks', next_cursor)
+
+elif current_page_number('read_tasks') > 1:
+    st.info("There are no more tasks on this page.")
+    page_controls('read_tasks', next_cursor)
+
+elif search or not task_filter.is_default:
+    st.info("No tasks match your search or filters.")
+
+elif show_archived:
+    st.info("There are no archived tasks yet.")
+
+elif view != 'all':
+    st.info("No open tasks are due in this period.")
+
 else:
     st.info("Your task list is empty. Use the 'Add a task' page to get started!")
 
@@ -1,117 +1,82 @@
-import sqlite3
 import streamlit as st
 import pandas as pd
-from db_path import DB_PATH
-from datetime import datetime
+from task_repository import get_repository
+from task_scheduler import RECURRENCES
+from write_queue import WRITE_TIMEOUT
+from pagination import *
+from task_filters import filter_controls
+from task_cache import (cache_tasks, current_data_version, current_db_path,
+                        current_write_queue, load_all_tasks, stop_if_no_task_list)
+from task_snapshot import convert_task_types
 from debug import *
 
 
 ### Initialize session state variables ###
-if 'data_version' not in st.session_state:
-    st.session_state['data_version'] = 0
-
 # This flag is used to show a success message after an update
 if 'success_update_message' not in st.session_state:
     st.session_state['success_update_message'] = False
 
 ### LOAD DATA ONLY IF DATA HAVE CHANGED ###
-@st.cache_data
-def load_tasks(data_version):
+@cache_tasks
+def load_tasks(db_path, data_version, page_size, cursor, search, task_filter):
     """
-    Loads tasks from the database.
-    The data_version argument is used to invalidate the cache
-    when tasks are added, updated, or deleted.
+    Loads one page of tasks from the database, starting at cursor, only
+    those matching the search text if there is one and the filter, in the
+    filter's order.
+    The data_version argument is the database change counter, so the cache
+    is invalidated for every session when tasks are added, updated, or deleted.
+    Returns the page DataFrame and the cursor of the next page.
     """
-    conn = sqlite3.connect(DB_PATH, timeout=10)
-    try:
-        df = pd.read_sql_query('SELECT * FROM tasks ORDER BY created_date DESC', conn)
-
-        df['completed'] = df['completed'].astype(bool)
-
-        # Ensure completed_date is datetime or None for proper display/editing
-        # 'coerce' will turn invalid date strings (like NULL from DB) into NaT (Not a Time)
-        df['created_date'] = pd.to_datetime(df['created_date'],
-                                            errors = 'coerce')
-        df['completed_date'] = pd.to_datetime(df['completed_date'],
-                                              errors='coerce')
-        return df
-    finally:
-        conn.close()
-
-def update_task_in_db(task_id, task_description, completed_status, completed_date):
+    df, next_cursor = get_repository(db_path).read_page(page_size, cursor, search, task_filter)
+
+    # completed as bool and dates as datetime (NaT for NULL) for proper display/editing
+    return convert_task_types(df), next_cursor
+
+def update_tasks_in_db(edited_rows, task_ids):
     """
-    Updates a single task in the database.
-    completed_date should be a datetime object or None.
+    Applies every edited row of the data editor in a single transaction.
+    edited_rows is the data editor's {row_index: {column: new_value}} dict and
+    task_ids holds the task_id of each row position, so no DataFrame lookups
+    are needed to build the UPDATE parameters.
+    Returns a BatchResult with the applied count and per-row failures.
     """
+    add_debug_message("DEBUG: update_tasks_in_db called for %s edited row(s)", len(edited_rows))
 
-    ### DEBUGGING MESSAGES ###
-    add_debug_message(f"DEBUG: update_task_in_db called for task_id: {task_id}")
-    add_debug_message(f"DEBUG:   task_description: '{task_description}', completed_status: {completed_status}, completed_date: {completed_date}")
-    ###
-
-    conn = sqlite3.connect(DB_PATH, timeout=10)
-
-    # IT IS EXTREMELY IMPORTANT TO PROVIDE TASK_ID AS INTEGER (python int type)
-    # Also, handle potential NaN from pandas
-    task_id_int = int(task_id) if not pd.isna(task_id) else None
-    add_debug_message(f"DEBUG:   Original task_id type: {type(task_id)}, Converted task_id_int type: {type(task_id_int)}")
-
-    cursor = conn.cursor()
-    try:
-        # Convert boolean to integer for SQLite
-        completed_int = 1 if completed_status else 0
-        
-        # Convert datetime to string for SQLite, or None if it's NaT or None
-        # Ensure completed_date is handled correctly if it's NaT from pandas
-        completed_date_str = None
-        if not pd.isna(completed_date): # Check if it's a valid datetime (not NaT)
-            completed_date_str = completed_date.strftime('%Y-%m-%d %H:%M:%S')
-
-        update_query = '''
-        UPDATE tasks
-        SET task = ?, completed = ?, completed_date = ?
-        WHERE task_id = ?
-        '''
-        
-        ### debug no task_id value
-        if task_id_int is None:
-            add_debug_message(f"ERROR: Cannot update task: task_id is invalid (None or NaN).")
-            return False
-
-        ### DEBUG BLOCK ###
-        add_debug_message(f"DEBUG:   Executing query: {update_query} with params: ('{task_description}', {completed_int}, '{completed_date_str}', {task_id_int})")
-        add_debug_message(f"DEBUG:   Type of task_id_int: {type(task_id_int)}")
-        ###
-
-        cursor.execute(update_query,
-                       (task_description, completed_int, completed_date_str, task_id_int))
-        
-        rows_affected = cursor.rowcount
-        add_debug_message(f"DEBUG:   Rows affected by update: {rows_affected}")
-    
-        conn.commit()
-        add_debug_message(f"DEBUG:   Commit successful for task_id: {task_id}")
-        return True # Indicate success
-    
-    except Exception as e:
-        add_debug_message(f"ERROR: Error updating task {task_id}: {e}")
-        st.error(f"Error updating task {task_id}: {e}")
-        return False # Indicate failure
-    
-    finally:
-        conn.close()
+    updates = {row_index: {'task_id': task_ids[row_index], **changes}
+               for row_index, changes in edited_rows.items()}
+    # queued to the single writer, which commits it together with other sessions' writes
+    result = current_write_queue().update_tasks(updates).result(WRITE_TIMEOUT)
+
+    add_debug_message("DEBUG:   Rows applied: %s, failures: %s", result.applied, result.failures)
+    return result
 
 st.toggle('Debug Mode', key='debug_mode')
 
 st.header("📝 Update Your Tasks")
+stop_if_no_task_list("Your task list is empty. Use the 'Add a task' page to get started!")
 
-# Load tasks
+# Load the current page of tasks
+search = search_box('update_tasks')
+task_filter = filter_controls('update_tasks')
+page_size = page_size_selector('update_tasks')
 try:
-    df = load_tasks(st.session_state.data_version)
-    
+    with timed('cache load'):
+        if page_size == ALL_TASKS and not search and task_filter.is_default:
+            # the whole table, patched incrementally instead of reloaded
+            df, next_cursor = load_all_tasks(), None
+        else:
+            df, next_cursor = load_tasks(current_db_path(), current_data_version(),
+                                         None if page_size == ALL_TASKS else page_size,
+                                         current_cursor('update_tasks'),
+                                         search,
+                                         task_filter)
+
 except Exception as e:
     st.error(f"Error loading tasks: {e}")
-    df = pd.DataFrame() # Use an empty DataFrame on error
+    df, next_cursor = pd.DataFrame(), None # Use an empty DataFrame on error
+
+# One editor state per page, search and filter, so edits made on one page never apply to another
+editor_key = f"update_data_editor_{current_page_number('update_tasks')}_{search}_{hash(task_filter)}"
 
 if not df.empty:
     # Define column configuration for st.data_editor
@@ -121,62 +86,55 @@ if not df.empty:
         "created_date": st.column_config.DatetimeColumn("Created On", disabled=True, format="YYYY-MM-DD HH:mm:ss"),
         "completed": st.column_config.CheckboxColumn("Completed", help="Mark as completed"),
         "completed_date": st.column_config.DatetimeColumn("Completed On", disabled=True, format="YYYY-MM-DD HH:mm:ss"),
+        "due_date": st.column_config.DateColumn("Due On", help="Day the task is due (clear it for none)"),
+        "recurrence": st.column_config.SelectboxColumn("Repeats", options=RECURRENCES,
+                                                       help="Once completed, the task comes back one period after its due date"),
     }
 
     # Display data editor
     # The key is important for Streamlit to track changes
-    edited_df = st.data_editor(
-        df,
-        column_config=column_config_dict,
-        hide_index=True,
-        width='content',
-        # this key will create a dict to
-        # store changes made using the dataframe editor
-        key="update_data_editor"
-
-    )
+    with timed('render'):
+        edited_df = st.data_editor(
+            df,
+            column_config=column_config_dict,
+            hide_index=True,
+            width='content',
+            # this key will create a dict to
+            # store changes made using the dataframe editor
+            key=editor_key
+        )
 
     # Check for changes and update database
-    # st.session_state.update_data_editor will contain information about edited rows
-    updates = st.session_state.update_data_editor['edited_rows']
+    # st.session_state[editor_key] will contain information about edited rows
+    updates = st.session_state[editor_key]['edited_rows']
     if st.button('Update Tasks') and updates: # Changed button label for clarity
-        add_debug_message(f"DEBUG: --- 'Update' button clicked ---")
-        add_debug_message(f"DEBUG: Detected updates from data_editor: {updates}")
+        add_debug_message("DEBUG: --- 'Update' button clicked ---")
+        add_debug_message("DEBUG: Detected updates from data_editor: %s", updates)
         st.session_state.updated_tasks_count = 0
-        
-        for edited_row_index, changes in st.session_state.update_data_editor['edited_rows'].items():
-            task_id = df.loc[edited_row_index, 'task_id']
-            if pd.isna(task_id): # This check is already in update_task_in_db, but good to have here too.
-                add_debug_message(f"ERROR: task_id is NaN for edited row index {edited_row_index}. Skipping update.")
-                st.error(f"Cannot update task: task_id is missing for row {edited_row_index}.")
-                continue # Skip to next edited row
-
-            # Get current values from the original dataframe for unchanged fields
-            current_task_description = df.loc[edited_row_index, 'task']
-            current_completed_status = df.loc[edited_row_index, 'completed']
-            current_completed_date = df.loc[edited_row_index, 'completed_date']
-
-            # Apply changes if they exist, otherwise keep current values
-            new_task_description = changes.get('task', current_task_description)
-            new_completed_status = changes.get('completed', current_completed_status)
-
-            # Logic for completed_date based on new_completed_status
-            new_completed_date = current_completed_date
-            if 'completed' in changes: # Only update completed_date if completed status was changed
-                new_completed_date = datetime.now() if new_completed_status else None
-
-            add_debug_message(f"DEBUG:   Calling update_task_in_db for row {edited_row_index} (task_id: {task_id})")
-            add_debug_message(f"DEBUG:     new_task_description: '{new_task_description}', new_completed_status: {new_completed_status}, new_completed_date: {new_completed_date}")
-            if update_task_in_db(task_id, new_task_description, new_completed_status, new_completed_date):
-                st.session_state.updated_tasks_count += 1
-                add_debug_message(f"DEBUG:   Task {task_id} successfully processed for update.")
-            else:
-                add_debug_message(f"DEBUG:   Failed to update task {task_id}.")
-        
+
+        try:
+            result = update_tasks_in_db(updates, df['task_id'].to_numpy())
+        except Exception as e:
+            add_debug_message("ERROR: Error updating tasks: %s", e)
+            st.error(f"Error updating tasks: {e}")
+        else:
+            # The batch is all-or-nothing, so any failure means nothing was saved
+            for edited_row_index, reason in result.failures.items():
+                st.error(f"Cannot update row {edited_row_index}: {reason}.")
+            st.session_state.updated_tasks_count = result.applied
+
         if st.session_state.updated_tasks_count > 0:
-            st.session_state.data_version += 1 # Invalidate cache to force data reload
             st.session_state['success_update_message'] = True # Set flag to show success message
-            st.rerun() # Rerun to show updated data and clear edited_rows
+            st.rerun() # Rerun to show updated data (the DB version changed) and clear edited_rows
+
+    page_controls('update_tasks', next_cursor)
+
+elif current_page_number('update_tasks') > 1:
+    st.info("There are no more tasks on this page.")
+    page_controls('update_tasks', next_cursor)
+
+elif search or not task_filter.is_default:
+    st.info("No tasks match your search or filters.")
 
 else:
     st.info("Your task list is empty. Use the 'Add a task' page to get started!")
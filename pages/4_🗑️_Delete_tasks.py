@@ -1,56 +1,86 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
-from db_path import DB_PATH
+from task_repository import get_repository
+from write_queue import WRITE_TIMEOUT
+from pagination import *
+from task_filters import filter_controls
+from task_cache import (cache_tasks, current_data_version, current_db_path,
+                        current_write_queue, load_all_tasks, start_maintenance_worker,
+                        stop_if_no_task_list)
+from task_selection import TaskSelection
+from task_snapshot import convert_task_types
 from debug import *
 
-if not 'select_all_state' in st.session_state:
-    st.session_state['select_all_state'] = False
+# Which tasks are ticked, kept apart from the cached task data
+if 'delete_selection' not in st.session_state:
+    st.session_state['delete_selection'] = TaskSelection()
+selection = st.session_state['delete_selection']
 
-if 'data_version' not in st.session_state:
-    st.session_state['data_version'] = 0
+# Number of tasks deleted by the last click, shown once after the rerun
+if 'tasks_deleted' not in st.session_state:
+    st.session_state['tasks_deleted'] = 0
 
 st.toggle('Debug Mode', key='debug_mode')
 
-@st.cache_data
-def load_tasks_from_db(data_version):
+stop_if_no_task_list("Tu lista de tareas está vacía: no hay nada que eliminar.")
+
+# Soft-deleted tasks are removed for good by this background worker
+start_maintenance_worker(current_db_path())
+
+@cache_tasks
+def load_tasks_from_db(db_path, data_version, page_size, cursor, search, task_filter):
     # This function will now raise an exception on failure, which is handled outside.
-    add_debug_message(f"DEBUG: Entering load_tasks_from_db (data_version: {data_version})")
-    conn = sqlite3.connect(DB_PATH, timeout=10) # Add a timeout to wait for DB lock release
+    # Returns one page of tasks (only those matching search, if given, and the filter,
+    # in the filter's order) and the cursor of the next page.
+    add_debug_message("DEBUG: Entering load_tasks_from_db (data_version: %s, cursor: %s, search: %s)",
+                      data_version, cursor, search)
     try:
-        df = pd.read_sql_query('SELECT * FROM tasks ORDER BY created_date DESC', conn)
-        df['completed'] = df['completed'].astype(bool)
+        df, next_cursor = get_repository(db_path).read_page(page_size, cursor, search, task_filter)
+        df = convert_task_types(df)
 
-        add_debug_message(f"DEBUG: Successfully loaded {len(df)} tasks from DB.")
-        return df
+        add_debug_message("DEBUG: Successfully loaded %s tasks from DB.", len(df))
+        return df, next_cursor
     
     except Exception as e:
 
-        add_debug_message(f"ERROR: Error in load_tasks_from_db: {e}")
+        add_debug_message("ERROR: Error in load_tasks_from_db: %s", e)
         raise # Re-raise the exception to be caught by the calling try-except block
-    
-    finally:
-        conn.close()
+
+def sync_ticked_rows(editor_key, task_ids):
+    # data editor callback: fold the ticks and unticks into the selection
+    for row_index, changes in st.session_state[editor_key]['edited_rows'].items():
+        if 'Seleccionar' in changes:
+            selection.set(task_ids[row_index], changes['Seleccionar'])
 
 # Load data
-add_debug_message(f"DEBUG: Attempting to load tasks from database.")
+add_debug_message("DEBUG: Attempting to load tasks from database.")
 
+search = search_box('delete_tasks', 'Buscar tareas', 'p. ej. compra lec  o  "llamar al banco"')
+task_filter = filter_controls('delete_tasks', language='es')
+page_size = page_size_selector('delete_tasks')
 try:
     # Attempt to load data from the cached function
-    df = load_tasks_from_db(st.session_state.data_version)
+    with timed('cache load'):
+        if page_size == ALL_TASKS and not search and task_filter.is_default:
+            # the whole table, patched incrementally instead of reloaded
+            df, next_cursor = load_all_tasks(), None
+        else:
+            df, next_cursor = load_tasks_from_db(current_db_path(), current_data_version(),
+                                                 None if page_size == ALL_TASKS else page_size,
+                                                 current_cursor('delete_tasks'),
+                                                 search,
+                                                 task_filter)
 
 except Exception as e:
     # If loading fails, show an error and use an empty DataFrame for this run.
     # The failed result is NOT cached.
     st.error(f"Error loading tasks: {e}")
-    df = pd.DataFrame() # Ensure df is defined as an empty DataFrame on error
-
-# Store original columns before adding 'Seleccionar'
-original_cols = list(df.columns)
+    df, next_cursor = pd.DataFrame(), None # Ensure df is defined as an empty DataFrame on error
 
-# Add 'Seleccionar' column and apply selection state
-df['Seleccionar'] = st.session_state.select_all_state
-df = df[['Seleccionar'] + original_cols]
+# Add the 'Seleccionar' column in place (the loaders already return a fresh
+# frame) from the selection, without copying or reordering the table
+with timed('selection'):
+    df.insert(0, 'Seleccionar', selection.mask(df) if not df.empty else pd.Series(dtype=bool))
 
 st.subheader("Lista de Tareas - Marca para eliminar")
 
@@ -64,8 +94,11 @@ column_config_dict = {
         width=None,
     ),
     "task": st.column_config.TextColumn("Tarea", disabled=True, width=None),
-    "created_date": st.column_config.TextColumn("Fecha de Creación", disabled=True, width=None),
+    "created_date": st.column_config.DatetimeColumn("Fecha de Creación", disabled=True, width=None,
+                                                    format="YYYY-MM-DD HH:mm:ss"),
     "completed": st.column_config.CheckboxColumn("Completada", disabled=True, width=None),
+    "due_date": st.column_config.DateColumn("Fecha Límite", disabled=True, width=None),
+    "recurrence": st.column_config.TextColumn("Repetición", disabled=True, width=None),
     "task_id": None  # Hide the task_id column
 }
 
@@ -75,76 +108,82 @@ for col in df.columns:
     if col not in column_config_dict:
         column_config_dict[col] = st.column_config.Column(width=None)
 
+# One editor key per page and per selection generation, so the editor's own
+# checkbox state is dropped whenever the whole selection changes
+editor_key = (f"delete_data_editor_{current_page_number('delete_tasks')}_{search}_"
+              f"{hash(task_filter)}_{selection.generation}")
+
 # Mostrar y editar la tabla
-df_editable = st.data_editor(
-    df,
-    column_config=column_config_dict,
-    width='content',
-    hide_index=True,
-    key="delete_data_editor" # Add a key for the data_editor
-)
+with timed('render'):
+    st.data_editor(
+        df,
+        column_config=column_config_dict,
+        width='content',
+        hide_index=True,
+        key=editor_key,
+        on_change=sync_ticked_rows,
+        args=(editor_key, df['task_id'].to_numpy() if not df.empty else []),
+    )
 
-col1, col2 = st.columns([1, 2]) # Adjust columns for the new layout
+if df.empty and (search or not task_filter.is_default):
+    st.info("Ninguna tarea coincide con la búsqueda o los filtros.")
+
+page_controls('delete_tasks', next_cursor)
+
+# Soft delete only marks the tasks as deleted, which is instant whatever the
+# selection size; a background job removes them from the database later.
+st.toggle('Borrado rápido (se purgan en segundo plano)', key='soft_delete',
+          help='Las tareas desaparecen al instante y se eliminan definitivamente más tarde.')
+
+# Selection shortcuts: they only change the selection, never the data. They
+# act on the tasks matching the search and filters, as they are right now.
+st.caption('Selección')
+shown = (current_db_path(), search, task_filter)
+sel_cols = st.columns(5)
+sel_cols[0].button('Seleccionar todo', on_click=selection.select_all, args=shown,
+                   help='Todas las tareas que coinciden con la búsqueda y los filtros, en todas las páginas')
+sel_cols[1].button('Deseleccionar todo', on_click=selection.clear)
+sel_cols[2].button('Invertir selección', on_click=selection.invert, args=shown)
+sel_cols[3].button('Solo completadas', on_click=selection.select_status,
+                   args=(shown[0], True, *shown[1:]))
+sel_cols[4].button('Solo pendientes', on_click=selection.select_status,
+                   args=(shown[0], False, *shown[1:]))
 
-with col1:
 # Process elimination button
-    if st.button("Eliminar tareas"):
-        add_debug_message(f"DEBUG: 'Eliminar tareas' button clicked.")
-        df_selected = df_editable[df_editable['Seleccionar'] == True]
-
-        if not df_selected.empty:
-            add_debug_message(f"DEBUG: {len(df_selected)} tasks selected for deletion.")
-            selected_tasks_id_list = df_selected['task_id'].tolist()
-            add_debug_message(f"DEBUG: Selected task IDs: {selected_tasks_id_list}")
-
-            conn = sqlite3.connect(DB_PATH, timeout=10) 
-            cursor = conn.cursor()
-            try:
-                # Use a parameterized query to prevent SQL injection
-                placeholders = ','.join('?' for _ in selected_tasks_id_list)
-                query = f"DELETE FROM tasks WHERE task_id IN ({placeholders})"
-                
-                add_debug_message(f"DEBUG: Executing DELETE query: {query} with params: {selected_tasks_id_list}")
-                cursor.execute(query, selected_tasks_id_list)
-                
-                rows_deleted = cursor.rowcount
-                add_debug_message(f"DEBUG: {rows_deleted} rows affected by DELETE query.")
-                
-                conn.commit()
-                add_debug_message(f"DEBUG: Database commit successful.")
-
-                st.success(f"Se eliminaron {len(selected_tasks_id_list)} tarea(s) exitosamente.")
-                
-                # change data_version so next run reloads the new version of the table
-                st.session_state.data_version += 1 # Increment data version to invalidate cache
-                
-                add_debug_message(f"DEBUG: data_version incremented to {st.session_state.data_version}. Triggering rerun.")
-            
-            finally:
-                conn.close()
-
+if st.button("Eliminar tareas", type='primary'):
+    add_debug_message("DEBUG: 'Eliminar tareas' button clicked.")
+    selected_tasks_id_list = selection.task_ids()
+
+    if selected_tasks_id_list:
+        add_debug_message("DEBUG: %s tasks selected for deletion.", len(selected_tasks_id_list))
+        add_debug_message("DEBUG: Selected task IDs: %s", selected_tasks_id_list)
+
+        try:
+            future = current_write_queue().delete_tasks(selected_tasks_id_list,
+                                                    soft=st.session_state.soft_delete)
+            rows_deleted = future.result(WRITE_TIMEOUT)
+            add_debug_message("DEBUG: %s rows affected by DELETE query.", rows_deleted)
+            st.session_state['tasks_deleted'] = rows_deleted
+            selection.clear()
+
+            # the delete bumped the database version, so the next run reloads the table
+            add_debug_message("DEBUG: Triggering rerun.")
             st.rerun()
 
-        else:
-            add_debug_message(f"DEBUG: No tasks selected for deletion.")
-            st.warning("No has seleccionado ninguna tarea. Marca las casillas deseadas.")
-
-with col2:
-    # Use a single, stateful toggle for a cleaner UI and more robust state management
-    select_all_state = st.toggle(
-        'Seleccionar / Deseleccionar todo',
-        value=st.session_state.select_all_state,
-        key='select_all_toggle'
-    )
-    # If the user changes the toggle, update the session state and rerun the app
-    if select_all_state != st.session_state.select_all_state:
-        st.session_state.select_all_state = select_all_state
-        add_debug_message(f"DEBUG: 'Seleccionar / Deseleccionar todo' toggle changed to {select_all_state}. Triggering rerun.")
-        st.session_state.data_version += 1
-        st.rerun()
+        except Exception as e:
+            add_debug_message("ERROR: Error deleting tasks: %s", e)
+            st.error(f"Error deleting tasks: {e}")
+
+    else:
+        add_debug_message("DEBUG: No tasks selected for deletion.")
+        st.warning("No has seleccionado ninguna tarea. Marca las casillas deseadas.")
+
+if st.session_state['tasks_deleted']:
+    st.success(f"Se eliminaron {st.session_state['tasks_deleted']} tarea(s) exitosamente.")
+    st.session_state['tasks_deleted'] = 0
 
 # Mostrar info adicional (opcional)
-selected_tasks_count = (df_editable['Seleccionar'] == True).sum()
+selected_tasks_count = selection.count()
 if selected_tasks_count > 0:
     st.info(f"Tareas seleccionadas para eliminar: {selected_tasks_count}")
 
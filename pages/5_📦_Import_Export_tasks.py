@@ -0,0 +1,64 @@
+import tempfile
+import streamlit as st
+from bulk_io import FORMATS, detect_format, import_tasks, export_tasks
+from task_cache import current_db_path, current_write_queue, stop_if_no_task_list
+from task_repository import get_repository
+from debug import *
+
+st.toggle('Debug Mode', key='debug_mode')
+
+st.header('📦 Import and export tasks')
+
+### IMPORT ###
+st.subheader('Import tasks from a file')
+st.caption("CSV, JSON Lines or Parquet with a 'task' column and optional "
+           "'created_date', 'completed_date', 'completed', 'due_date' and 'recurrence' "
+           "('daily', 'weekly' or 'monthly') columns. "
+           "The whole file is checked first: if any row is invalid, nothing is added.")
+
+uploaded_file = st.file_uploader('Choose a file', type=['csv', 'jsonl', 'json', 'ndjson', 'parquet'])
+
+if uploaded_file is not None and st.button('Import tasks'):
+    add_debug_message("DEBUG: Importing file '%s' (%s bytes)", uploaded_file.name, uploaded_file.size)
+    progress_text = st.empty()
+
+    def show_progress(count):
+        progress_text.info(f'{count} tasks imported...')
+
+    try:
+        count = import_tasks(uploaded_file, detect_format(uploaded_file.name), show_progress,
+                             current_write_queue())
+        progress_text.empty()
+        st.success(f'Imported {count} task(s) from {uploaded_file.name}.')
+        add_debug_message("DEBUG: Imported %s tasks.", count)
+    except ValueError as e:
+        progress_text.empty()
+        add_debug_message("ERROR: Invalid file '%s': %s", uploaded_file.name, e)
+        st.error(f'Error importing tasks, nothing was added: {e}')
+    except Exception as e:
+        # the chunks written before the error stay imported
+        add_debug_message("ERROR: Error importing '%s': %s", uploaded_file.name, e)
+        st.error(f'Error importing tasks, the import stopped part way: {e}')
+
+### EXPORT ###
+st.subheader('Export all tasks')
+stop_if_no_task_list('This task list has no tasks to export yet.')
+
+export_format = st.selectbox('Format', FORMATS, key='export_format')
+# resolved now: the export runs on another thread, without this session's state
+export_db_path = current_db_path()
+
+def build_export():
+    # Runs only when the download button is clicked, on its own thread.
+    # Rows are streamed from a cursor into a temporary file instead of
+    # being collected in a DataFrame first.
+    export_file = tempfile.TemporaryFile()
+    export_tasks(export_file, export_format, get_repository(export_db_path))
+    export_file.seek(0)
+    return export_file
+
+st.download_button('Download tasks', build_export,
+                   file_name=f'tasks.{export_format}',
+                   on_click='ignore')
+
+show_debug_messages()
@@ -0,0 +1,72 @@
+import streamlit as st
+
+# Showing all tasks skips paging and uses the incrementally synced snapshot
+ALL_TASKS = 'All'
+
+PAGE_SIZES = [50, 100, 250, 500, 1000, ALL_TASKS]
+
+### Page navigation shared by the Read, Update and Delete pages ###
+# Each page keeps, in session state, the stack of keyset cursors of the pages
+# visited so far: the last cursor is the start of the page being shown
+# (None for the first page). Going forward pushes the next cursor and going
+# back pops one, so only the current page is ever loaded from the database.
+
+def _cursors_key(key):
+    return f'{key}_cursors'
+
+def reset_pages(key):
+    """Go back to the first page (e.g. after the page size changes)."""
+    st.session_state[_cursors_key(key)] = [None]
+
+def current_cursor(key):
+    """Return the cursor of the page to load for this page key."""
+    if _cursors_key(key) not in st.session_state:
+        reset_pages(key)
+    return st.session_state[_cursors_key(key)][-1]
+
+def current_page_number(key):
+    """1-based number of the page being shown."""
+    current_cursor(key)
+    return len(st.session_state[_cursors_key(key)])
+
+def page_size_selector(key):
+    """Render the page size selectbox and return the selected size."""
+    return st.selectbox('Tasks per page', PAGE_SIZES,
+                        key=f'{key}_page_size',
+                        on_change=reset_pages, args=(key,))
+
+def search_box(key, label='Search tasks',
+               placeholder='e.g. buy mil  or  "call the bank"'):
+    """
+    Render the full-text search box and return the search text ('' for none).
+    Words match as prefixes and "quoted text" as a phrase. A new search
+    starts again from its first page.
+    """
+    return st.text_input(label, key=f'{key}_search',
+                         placeholder=placeholder,
+                         on_change=reset_pages, args=(key,)).strip()
+
+def _next_page(key, next_cursor):
+    st.session_state[_cursors_key(key)].append(next_cursor)
+
+def _previous_page(key):
+    if len(st.session_state[_cursors_key(key)]) > 1:
+        st.session_state[_cursors_key(key)].pop()
+
+def page_controls(key, next_cursor):
+    """
+    Render Previous / Next buttons for the page currently shown.
+    next_cursor is the cursor returned with the current page (None on the last page).
+    """
+    page_number = current_page_number(key)
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        st.button('⬅️ Previous', key=f'{key}_previous',
+                  disabled=page_number == 1,
+                  on_click=_previous_page, args=(key,))
+    with col2:
+        st.button('Next ➡️', key=f'{key}_next',
+                  disabled=next_cursor is None,
+                  on_click=_next_page, args=(key, next_cursor))
+    with col3:
+        st.caption(f'Page {page_number}')
@@ -0,0 +1,168 @@
+"""
+In-memory read replica of a task database.
+
+Reads dominate: pages are opened far more often than anyone writes. With
+the replica turned on (TODO_READ_REPLICA=1), a repository keeps a copy of
+its database in memory, made with the SQLite backup API, and runs its
+read-only queries on it. Queries never touch the file, and never wait
+for writers.
+
+The copy is exactly one data version of the database: it is only used
+while the database is still at that version, so nothing stale is ever
+returned. Once the version moves on, the reads go to the database file
+as usual while a fresh copy is made in the background. That copy then
+replaces the old one, which is dropped when its last reader is done.
+"""
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Keep an in-memory copy of each database for the read queries
+READ_REPLICA = os.environ.get('TODO_READ_REPLICA', '').lower() in ('1', 'true', 'yes', 'on')
+
+# Idle connections kept open on a copy (more are opened while busy)
+REPLICA_POOL_SIZE = 4
+
+# Shortest time between two copies, so a stream of writes does not keep
+# the replica copying the database non-stop
+REPLICA_MIN_REFRESH_SECONDS = 1.0
+
+_copy_numbers = itertools.count()
+
+
+class _Copy:
+    """One in-memory copy of the database, at one data version."""
+
+    def __init__(self, uri, version, anchor):
+        self.uri = uri
+        self.version = version
+        self.idle = [anchor]
+        self.borrowed = 0
+        self.retired = False
+
+    def open(self):
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False,
+                               cached_statements=256)
+        conn.execute('PRAGMA query_only = 1')
+        return conn
+
+
+class ReadReplica:
+    """
+    Keeps an in-memory copy of a database for the read-only queries.
+    source() must return a context manager yielding a connection to the
+    database, and version_sql reads its data version.
+    """
+
+    def __init__(self, source, version_sql, pool_size=REPLICA_POOL_SIZE,
+                 min_refresh_seconds=REPLICA_MIN_REFRESH_SECONDS):
+        self.source = source
+        self.version_sql = version_sql
+        self.pool_size = pool_size
+        self.min_refresh_seconds = min_refresh_seconds
+        self._copy = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._last_refresh = float('-inf')
+
+    @property
+    def version(self):
+        """Data version of the current copy (None before the first one)."""
+        copy = self._copy
+        return copy.version if copy else None
+
+    @contextmanager
+    def connection(self, data_version):
+        """
+        Borrow a connection to the copy if it is at data_version, else
+        yield None (the caller reads the database itself) and start
+        making a new copy in the background.
+        """
+        with self._lock:
+            copy = self._copy
+            if copy is None or copy.version != data_version:
+                self._refresh_in_background()
+                copy = None
+            else:
+                conn = copy.idle.pop() if copy.idle else None
+                copy.borrowed += 1
+        if copy is None:
+            yield None
+            return
+
+        try:
+            if conn is None:
+                conn = copy.open()
+            yield conn
+        finally:
+            self._give_back(copy, conn)
+
+    def _give_back(self, copy, conn):
+        with self._lock:
+            copy.borrowed -= 1
+            if conn is not None and not copy.retired and len(copy.idle) < self.pool_size:
+                copy.idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+
+    ### Refreshing the copy ###
+    def _refresh_in_background(self):
+        # called with self._lock held
+        if self._refreshing or time.monotonic() - self._last_refresh < self.min_refresh_seconds:
+            return
+        self._refreshing = True
+        threading.Thread(target=self._refresh_quietly, name='task-read-replica', daemon=True).start()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # reads keep going to the database; the next stale read tries again
+            print(f'Read replica refresh failed: {e}')
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def refresh(self):
+        """Copy the database into memory now and make it the current copy."""
+        # A shared-cache in-memory database lets every reader connection
+        # see the one copy. (The memdb VFS cannot open a copy of a WAL-mode
+        # database, so it is not an option here.)
+        uri = f'file:task-replica-{os.getpid()}-{next(_copy_numbers)}?mode=memory&cache=shared'
+        anchor = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=256)
+        try:
+            with self.source() as conn:
+                # one read transaction: the copy is one consistent version
+                conn.backup(anchor)
+            version = anchor.execute(self.version_sql).fetchone()[0]
+            anchor.execute('PRAGMA query_only = 1')
+        except Exception:
+            anchor.close()
+            raise
+
+        copy = _Copy(uri, version, anchor)
+        with self._lock:
+            old, self._copy = self._copy, copy
+            self._last_refresh = time.monotonic()
+        self._retire(old)
+        return version
+
+    def _retire(self, copy):
+        # idle connections are closed now, borrowed ones when given back; the
+        # memory is freed when the last connection to the copy is closed
+        if copy is None:
+            return
+        with self._lock:
+            copy.retired = True
+            idle, copy.idle = copy.idle, []
+        for conn in idle:
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            copy, self._copy = self._copy, None
+        self._retire(copy)
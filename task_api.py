@@ -0,0 +1,308 @@
+"""
+HTTP/JSON API over the task store, for scripts and automation.
+
+Runs next to the Streamlit app on the same database, using the standard
+library only. Reads use the same repository queries as the pages and
+writes go through the same write queue, so API clients and page users are
+group-committed together.
+
+    python task_api.py                      # http://127.0.0.1:8502
+    python task_api.py --host 0.0.0.0 --port 9000
+
+Every request works on one tenant's task list, named by the X-Tenant header
+(the shared list without it), like ?tenant= on the pages. The header only
+routes the request: it is not authentication, so put the API behind your
+own if tenants must not reach each other's lists.
+
+Endpoints:
+
+    GET    /tasks?limit=100&cursor=...&search=...   one page, newest first
+                                                    (or best match first)
+    GET    /tasks/<id>
+    POST   /tasks             {"task": "..."} or {"tasks": ["...", ...]}
+    PATCH  /tasks             {"updates": [{"task_id": 1, "completed": true}, ...]}
+    PATCH  /tasks/<id>        {"task": "...", "completed": true,
+                               "due_date": "2024-05-31", "recurrence": "weekly"}
+    DELETE /tasks/<id>
+    POST   /tasks/delete      {"task_ids": [1, 2, 3], "soft": false}
+    GET    /version           {"data_version": N}
+
+List responses carry "next_cursor" (null on the last page): pass it back as
+?cursor= to get the next page. Every GET response has an ETag built from
+the database change counter; send it back in If-None-Match and the API
+answers 304 Not Modified without running the query while nothing changed.
+"""
+import argparse
+import base64
+import json
+import re
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from db_path import tenant_db_path
+from task_repository import get_repository
+from task_snapshot import convert_task_types
+from write_queue import get_write_queue, WRITE_TIMEOUT
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8502
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 10 * 1024 * 1024
+
+TASK_PATH = re.compile(r'^/tasks/(\d+)$')
+
+
+class APIError(Exception):
+    """An error reported to the client as {"error": message} with an HTTP status."""
+
+    def __init__(self, status, message, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+### JSON HELPERS ###
+def is_int64(value):
+    """An integer (JSON true and false are not) that SQLite can store."""
+    return isinstance(value, int) and not isinstance(value, bool) and -2 ** 63 <= value < 2 ** 63
+
+def tasks_json(df):
+    """Serialize task rows as a JSON array, dates as ISO 8601 UTC strings."""
+    return convert_task_types(df).to_json(orient='records', date_format='iso', date_unit='s')
+
+def encode_cursor(cursor):
+    if cursor is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(list(cursor)).encode()).decode()
+
+def decode_cursor(value):
+    try:
+        cursor = tuple(json.loads(base64.urlsafe_b64decode(value.encode())))
+    except (TypeError, ValueError):
+        cursor = None
+    # (sort value, task_id), both passed to the query as parameters: only
+    # scalars SQLite can bind
+    if (cursor is None or len(cursor) != 2
+            or not (isinstance(cursor[0], (str, float, type(None))) or is_int64(cursor[0]))
+            or not is_int64(cursor[1])):
+        raise APIError(HTTPStatus.BAD_REQUEST, 'invalid cursor')
+    return cursor
+
+
+class TaskAPIHandler(BaseHTTPRequestHandler):
+    server_version = 'TaskAPI/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    ### Dispatch ###
+    def do_GET(self):
+        self._handle(self._get)
+
+    def do_POST(self):
+        self._handle(self._post)
+
+    def do_PATCH(self):
+        self._handle(self._patch)
+
+    def do_DELETE(self):
+        self._handle(self._delete)
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        try:
+            try:
+                self.db_path = tenant_db_path(self.headers.get('X-Tenant'))
+            except ValueError as e:
+                raise APIError(HTTPStatus.BAD_REQUEST, str(e))
+            method(url.path.rstrip('/') or '/', parse_qs(url.query))
+        except APIError as e:
+            self._send_json(e.status, json.dumps({'error': str(e), **e.details}))
+        except Exception as e:
+            self.log_error('Unhandled error: %s', e)
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, json.dumps({'error': 'internal error'}))
+
+    ### Reads ###
+    def _get(self, path, query):
+        # a tenant without a task list reads as a new, empty one (version 0):
+        # reading does not create its shard
+        repository = get_repository(self.db_path, create=False)
+        # one primary-key lookup: answer 304 before running any query
+        data_version = repository.data_version() if repository is not None else 0
+        # versions of different shards are unrelated: tell them apart
+        etag = f'"{self.headers.get("X-Tenant", "").lower()}:{data_version}"'
+        if etag in self.headers.get('If-None-Match', ''):
+            self._send(HTTPStatus.NOT_MODIFIED, headers={'ETag': etag})
+            return
+
+        if path == '/version':
+            body = json.dumps({'data_version': data_version})
+        elif path == '/tasks':
+            limit = self._int_param(query, 'limit', DEFAULT_PAGE_SIZE)
+            if not 1 <= limit <= MAX_PAGE_SIZE:
+                raise APIError(HTTPStatus.BAD_REQUEST, f'limit must be between 1 and {MAX_PAGE_SIZE}')
+            cursor = query.get('cursor', [None])[0]
+            cursor = decode_cursor(cursor) if cursor else None
+            if repository is None:
+                body = '{"tasks": [], "next_cursor": null}'
+            else:
+                df, next_cursor = repository.read_page(limit, cursor,
+                                                       query.get('search', [''])[0].strip())
+                body = (f'{{"tasks": {tasks_json(df)}, '
+                        f'"next_cursor": {json.dumps(encode_cursor(next_cursor))}}}')
+        elif match := TASK_PATH.match(path):
+            task_id = self._path_task_id(match)
+            if repository is None:
+                raise APIError(HTTPStatus.NOT_FOUND, 'task not found')
+            df = repository.read_tasks_by_id([task_id])
+            if df.empty:
+                raise APIError(HTTPStatus.NOT_FOUND, 'task not found')
+            body = tasks_json(df)[1:-1]  # the only object of the array
+        else:
+            raise APIError(HTTPStatus.NOT_FOUND, 'not found')
+
+        self._send_json(HTTPStatus.OK, body,
+                        headers={'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'X-Tenant'})
+
+    ### Writes ###
+    def _post(self, path, query):
+        body = self._read_json()
+        write_queue = get_write_queue(self.db_path)
+        if path == '/tasks':
+            tasks = body.get('tasks', [body.get('task')] if 'task' in body else None)
+            if not isinstance(tasks, list) or not tasks:
+                raise APIError(HTTPStatus.BAD_REQUEST, 'expected "task" or a non-empty "tasks" list')
+            if not all(isinstance(task, str) and task.strip() for task in tasks):
+                raise APIError(HTTPStatus.UNPROCESSABLE_ENTITY, 'task descriptions must be non-empty strings')
+            # one queued write per task: the writer commits them together and
+            # each future carries its new task_id
+            futures = [write_queue.create_task(task.strip()) for task in tasks]
+            task_ids = [future.result(WRITE_TIMEOUT) for future in futures]
+            self._send_json(HTTPStatus.CREATED, json.dumps({'task_ids': task_ids}))
+        elif path == '/tasks/delete':
+            task_ids, soft = body.get('task_ids'), body.get('soft', False)
+            if not isinstance(task_ids, list) or not all(is_int64(i) for i in task_ids):
+                raise APIError(HTTPStatus.BAD_REQUEST, 'expected a "task_ids" list of integers')
+            if not isinstance(soft, bool):
+                raise APIError(HTTPStatus.UNPROCESSABLE_ENTITY, '"soft" must be true or false')
+            deleted = write_queue.delete_tasks(task_ids, soft).result(WRITE_TIMEOUT)
+            self._send_json(HTTPStatus.OK, json.dumps({'deleted': deleted}))
+        else:
+            raise APIError(HTTPStatus.NOT_FOUND, 'not found')
+
+    def _patch(self, path, query):
+        body = self._read_json()
+        if path == '/tasks':
+            updates = body.get('updates')
+            if not isinstance(updates, list) or not all(isinstance(row, dict) for row in updates):
+                raise APIError(HTTPStatus.BAD_REQUEST, 'expected an "updates" list of objects')
+            updates = dict(enumerate(updates))
+        elif match := TASK_PATH.match(path):
+            updates = {0: {**body, 'task_id': self._path_task_id(match)}}
+        else:
+            raise APIError(HTTPStatus.NOT_FOUND, 'not found')
+
+        # only the editable fields are passed on
+        fields = ('task_id', 'task', 'completed', 'due_date', 'recurrence')
+        updates = {key: {field: row[field] for field in fields if field in row}
+                   for key, row in updates.items()}
+        failures = {str(key): failure for key, row in updates.items()
+                    if (failure := self._update_failure(row))}
+        if failures:
+            raise APIError(HTTPStatus.UNPROCESSABLE_ENTITY, 'no task was updated', failures=failures)
+        result = get_write_queue(self.db_path).update_tasks(updates).result(WRITE_TIMEOUT)
+        if not result.ok:
+            # all-or-nothing: failures are keyed by position in "updates"
+            raise APIError(HTTPStatus.UNPROCESSABLE_ENTITY, 'no task was updated',
+                           failures={str(key): reason for key, reason in result.failures.items()})
+        self._send_json(HTTPStatus.OK, json.dumps({'applied': result.applied}))
+
+    def _delete(self, path, query):
+        match = TASK_PATH.match(path)
+        if not match:
+            raise APIError(HTTPStatus.NOT_FOUND, 'not found')
+        deleted = get_write_queue(self.db_path).delete_tasks([self._path_task_id(match)]) \
+            .result(WRITE_TIMEOUT)
+        if not deleted:
+            raise APIError(HTTPStatus.NOT_FOUND, 'task not found')
+        self._send(HTTPStatus.NO_CONTENT)
+
+    ### Request / response helpers ###
+    def _path_task_id(self, match):
+        task_id = int(match.group(1))
+        if not is_int64(task_id):
+            # no task can have it
+            raise APIError(HTTPStatus.NOT_FOUND, 'task not found')
+        return task_id
+
+    def _update_failure(self, row):
+        """Why an update row has the wrong types, or None. Values are never coerced."""
+        if not is_int64(row.get('task_id')):
+            return 'task_id must be an integer'
+        if 'task' in row and not isinstance(row['task'], str):
+            return 'task must be a string'
+        # JSON has booleans: "false" or 0 would otherwise count as completed
+        if 'completed' in row and not isinstance(row['completed'], bool):
+            return 'completed must be true or false'
+        return None
+
+    def _int_param(self, query, name, default):
+        try:
+            return int(query.get(name, [default])[0])
+        except ValueError:
+            raise APIError(HTTPStatus.BAD_REQUEST, f'{name} must be an integer')
+
+    def _read_json(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise APIError(HTTPStatus.BAD_REQUEST, 'invalid Content-Length')
+        if length > MAX_BODY_SIZE:
+            raise APIError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'request body too large')
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            raise APIError(HTTPStatus.BAD_REQUEST, 'request body is not valid JSON')
+        if not isinstance(body, dict):
+            raise APIError(HTTPStatus.BAD_REQUEST, 'request body must be a JSON object')
+        return body
+
+    def _send_json(self, status, body, headers=None):
+        self._send(status, body.encode('utf-8'),
+                   {'Content-Type': 'application/json; charset=utf-8', **(headers or {})})
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    return ThreadingHTTPServer((host, port), TaskAPIHandler)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the tasks over an HTTP/JSON API.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port)
+    print(f'Task API listening on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
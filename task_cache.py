@@ -0,0 +1,110 @@
+import streamlit as st
+from db_path import tenant_db_path
+from task_repository import get_repository, on_shard_closed
+from task_scheduler import TaskScheduler
+from task_snapshot import TaskSnapshot
+from task_maintenance import MaintenanceWorker
+from write_queue import get_write_queue
+
+### CACHING OF TASK LOADERS ###
+# Loaders are keyed on the database's own change counter instead of a
+# per-session counter, so every session shares the same cached snapshot for
+# a given database version and a write by any user invalidates it for all.
+# Every tenant has its own database shard, so loaders also take the shard's
+# path: the versions of two shards say nothing about each other.
+
+# Snapshots older than this are dropped even if nobody wrote to the database
+CACHE_TTL_SECONDS = 10 * 60
+
+# Upper bound on cached snapshots per loader (DB versions x pages x page sizes)
+CACHE_MAX_ENTRIES = 64
+
+# Decorator for the page loaders: st.cache_data with a bounded size and TTL
+cache_tasks = st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES)
+
+### TENANT OF THE SESSION ###
+# The tenant comes from the URL (?tenant=team-a) and is remembered for the
+# rest of the session, as moving between pages drops the query string.
+
+def current_tenant():
+    """Tenant name of this session, or None for the shared task list."""
+    tenant = st.query_params.get('tenant')
+    if tenant is not None:
+        st.session_state['tenant'] = tenant
+    return st.session_state.get('tenant')
+
+def current_db_path():
+    """Database shard of this session's tenant; stops the page for an invalid name."""
+    try:
+        return tenant_db_path(current_tenant())
+    except ValueError as e:
+        st.error(f'Cannot open the task list: {e}')
+        st.stop()
+
+def current_repository():
+    return get_repository(current_db_path())
+
+def stop_if_no_task_list(message):
+    """
+    Stop a page that only reads, showing message, while this session's
+    tenant has no task list yet: reading must not create the shard, the
+    first task added does.
+    """
+    if get_repository(current_db_path(), create=False) is None:
+        st.info(message)
+        st.stop()
+
+def current_write_queue():
+    return get_write_queue(current_db_path())
+
+def current_data_version():
+    """One primary-key lookup per rerun: the version to key the loaders on."""
+    return current_repository().data_version()
+
+### PER-SHARD RESOURCES ###
+# Shared by every session of the process, and dropped when get_repository
+# closes the shard for being idle (a reopened shard gets new ones).
+
+def _repository_open(resource):
+    return not resource.repository.closed
+
+@st.cache_resource(validate=_repository_open)
+def get_task_snapshot(db_path):
+    """The process-wide incrementally synced snapshot of all tasks of a shard."""
+    return TaskSnapshot(get_repository(db_path))
+
+def load_all_tasks():
+    """
+    All tasks with display dtypes. Only rows changed since the last call
+    (by any session) are read from the database.
+    """
+    return get_task_snapshot(current_db_path()).sync()
+
+@st.cache_resource(validate=_repository_open)
+def get_task_scheduler(db_path):
+    """The process-wide next-due queue of a shard's open tasks (see task_scheduler.py)."""
+    return TaskScheduler(get_repository(db_path))
+
+# Running maintenance worker of each shard, to stop it with the shard
+_maintenance_workers = {}
+
+@st.cache_resource(validate=_repository_open)
+def start_maintenance_worker(db_path):
+    """Start the background maintenance jobs of a shard, once per process."""
+    worker = MaintenanceWorker(get_repository(db_path))
+    worker.start()
+    previous = _maintenance_workers.get(db_path)
+    if previous is not None:
+        previous.stop()
+    _maintenance_workers[db_path] = worker
+    return worker
+
+def _release_shard(db_path, repository):
+    worker = _maintenance_workers.get(db_path)
+    if worker is not None and worker.repository is repository:
+        del _maintenance_workers[db_path]
+        worker.stop()
+    for resource in (get_task_snapshot, get_task_scheduler, start_maintenance_worker):
+        resource.clear(db_path)
+
+on_shard_closed(_release_shard)
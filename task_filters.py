@@ -0,0 +1,82 @@
+import streamlit as st
+from datetime import timedelta
+
+from pagination import reset_pages
+from task_repository import SORT_COLUMNS, TaskFilter
+from task_scheduler import day_epoch
+from task_selection import STATUS_FILTERS
+
+### Filter and sort controls shared by the Read, Update and Delete pages ###
+# The controls only build a TaskFilter: the repository turns it into the
+# WHERE / ORDER BY of the page query, so filtering and sorting happen in
+# SQLite on an index instead of on the loaded DataFrame. The filter is
+# passed to the cached loaders, so each combination is cached on its own.
+
+FILTER_LABELS = {
+    'en': {
+        'title': 'Filter and sort',
+        'status': 'Status',
+        'statuses': {'all': 'All', 'completed': 'Completed', 'pending': 'Pending'},
+        'created': 'Created between',
+        'completed': 'Completed between',
+        'sort': 'Sort by',
+        'sorts': {'created_date': 'Creation date', 'completed_date': 'Completion date',
+                  'task': 'Task'},
+        'descending': 'Descending',
+    },
+    'es': {
+        'title': 'Filtrar y ordenar',
+        'status': 'Estado',
+        'statuses': {'all': 'Todas', 'completed': 'Completadas', 'pending': 'Pendientes'},
+        'created': 'Creadas entre',
+        'completed': 'Completadas entre',
+        'sort': 'Ordenar por',
+        'sorts': {'created_date': 'Fecha de creación', 'completed_date': 'Fecha de finalización',
+                  'task': 'Tarea'},
+        'descending': 'Descendente',
+    },
+}
+
+def _date_range(days):
+    """(from, to) epochs of a date_input range: the end day is included whole."""
+    days = tuple(days or ())
+    if not days:
+        return None, None
+    # while only the first day is picked, filter from that day on
+    first = day_epoch(days[0])
+    last = day_epoch(days[1] + timedelta(days=1)) if len(days) > 1 else None
+    return first, last
+
+def filter_controls(key, language='en') -> TaskFilter:
+    """
+    Render the status, date range and sort controls in an expander and
+    return the TaskFilter they describe. Changing any of them starts again
+    from the first page.
+    """
+    labels = FILTER_LABELS[language]
+    with st.expander(labels['title']):
+        col1, col2 = st.columns(2)
+        status = col1.radio(labels['status'], list(STATUS_FILTERS),
+                            format_func=labels['statuses'].get, horizontal=True,
+                            key=f'{key}_filter_status',
+                            on_change=reset_pages, args=(key,))
+        created = col1.date_input(labels['created'], value=[],
+                                  key=f'{key}_filter_created',
+                                  on_change=reset_pages, args=(key,))
+        completed = col1.date_input(labels['completed'], value=[],
+                                    key=f'{key}_filter_completed',
+                                    on_change=reset_pages, args=(key,))
+        sort = col2.selectbox(labels['sort'], list(SORT_COLUMNS),
+                              format_func=labels['sorts'].get,
+                              key=f'{key}_filter_sort',
+                              on_change=reset_pages, args=(key,))
+        descending = col2.toggle(labels['descending'], value=True,
+                                 key=f'{key}_filter_descending',
+                                 on_change=reset_pages, args=(key,))
+
+    created_from, created_to = _date_range(created)
+    completed_from, completed_to = _date_range(completed)
+    return TaskFilter(completed=STATUS_FILTERS[status],
+                      created_from=created_from, created_to=created_to,
+                      completed_from=completed_from, completed_to=completed_to,
+                      sort=sort, descending=descending)
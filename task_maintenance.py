@@ -0,0 +1,147 @@
+"""
+Background maintenance of the tasks database.
+
+The maintenance worker permanently removes soft-deleted tasks in small
+batches and hands the freed pages back with incremental vacuum steps, so
+deletes from the pages stay instant. It also moves tasks completed more
+than ARCHIVE_AFTER_DAYS ago to the archive table, keeping the tasks table
+the pages read small, and renews the completed recurring tasks (see
+task_scheduler.py). It also trims the task change log the snapshots and
+schedulers sync from. All of them work in short batches so interactive
+writers are never blocked for long. The same jobs can be run from the
+command line (e.g. from cron):
+
+    python task_maintenance.py purge
+    python task_maintenance.py archive --days 90
+    python task_maintenance.py renew
+    python task_maintenance.py vacuum     # one-off, takes an exclusive lock
+    python task_maintenance.py purge --tenant team-a
+    python task_maintenance.py archive --all-tenants
+
+Every tenant has its own database shard; the app runs one worker per shard
+in use by the process.
+"""
+import argparse
+import glob
+import os
+import threading
+
+from db_path import TENANTS_DIR, tenant_db_path
+from task_repository import get_repository
+from task_snapshot import CHANGE_LOG_KEEP
+
+# How often the background worker looks for tasks to purge or archive
+MAINTENANCE_INTERVAL_SECONDS = 60
+
+# Soft-deleted tasks are kept at least this long before they are purged
+PURGE_AFTER_SECONDS = 0
+
+# Rows removed per transaction, and the pause between transactions
+PURGE_BATCH_SIZE = 500
+PURGE_BATCH_PAUSE = 0.05
+
+# Free pages returned to the file system after each purge
+VACUUM_PAGES = 1000
+
+# Completed tasks are archived this many days after their completion, by
+# the worker and by default from the command line
+ARCHIVE_AFTER_DAYS = float(os.environ.get('TODO_ARCHIVE_AFTER_DAYS', 30))
+
+# Tasks archived per transaction, and the pause between transactions
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_BATCH_PAUSE = 0.05
+
+# Recurring tasks renewed per transaction, and the pause between transactions
+RENEW_BATCH_SIZE = 500
+RENEW_BATCH_PAUSE = 0.05
+
+
+def purge_once(repository=None):
+    """Purge soft-deleted tasks and release the freed space. Returns rows purged."""
+    repository = repository or get_repository()
+    purged = repository.purge_deleted(PURGE_AFTER_SECONDS,
+                                      PURGE_BATCH_SIZE,
+                                      PURGE_BATCH_PAUSE)
+    if purged:
+        repository.incremental_vacuum(VACUUM_PAGES)
+    return purged
+
+
+def archive_once(repository=None, days=ARCHIVE_AFTER_DAYS):
+    """Archive tasks completed more than `days` days ago. Returns tasks archived."""
+    repository = repository or get_repository()
+    return repository.archive_completed(int(days * 24 * 3600),
+                                        ARCHIVE_BATCH_SIZE,
+                                        ARCHIVE_BATCH_PAUSE)
+
+
+def renew_once(repository=None):
+    """Add the next occurrence of the completed recurring tasks. Returns tasks added."""
+    repository = repository or get_repository()
+    return repository.renew_recurring(RENEW_BATCH_SIZE, RENEW_BATCH_PAUSE)
+
+
+def prune_change_log_once(repository=None):
+    """
+    Trim the task change log to its newest CHANGE_LOG_KEEP entries. Returns
+    entries deleted. Readers further behind than that do a full reload.
+    """
+    repository = repository or get_repository()
+    return repository.prune_change_log(CHANGE_LOG_KEEP)
+
+
+class MaintenanceWorker(threading.Thread):
+    """Daemon thread that runs the maintenance jobs every MAINTENANCE_INTERVAL_SECONDS."""
+
+    def __init__(self, repository, interval=MAINTENANCE_INTERVAL_SECONDS):
+        super().__init__(name='task-maintenance-worker', daemon=True)
+        self.repository = repository
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            for job in (purge_once, renew_once, archive_once, prune_change_log_once):
+                if self._stop_event.is_set():
+                    # stopped with its shard: the repository is being closed
+                    return
+                try:
+                    job(self.repository)
+                except Exception as e:
+                    # keep the worker alive; the next round will try again
+                    print(f'{job.__name__} failed: {e}')
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Maintenance jobs for the tasks database.')
+    parser.add_argument('job', choices=['purge', 'archive', 'renew', 'vacuum'])
+    parser.add_argument('--days', type=float, default=ARCHIVE_AFTER_DAYS,
+                        help=f'archive: age of completion in days (default: {ARCHIVE_AFTER_DAYS:g}, from TODO_ARCHIVE_AFTER_DAYS)')
+    tenants = parser.add_mutually_exclusive_group()
+    tenants.add_argument('--tenant', help='Tenant whose shard to maintain (default: the shared database)')
+    tenants.add_argument('--all-tenants', action='store_true',
+                         help='The shared database and every tenant shard')
+    args = parser.parse_args(argv)
+
+    if args.all_tenants:
+        db_paths = [tenant_db_path()] + sorted(glob.glob(os.path.join(TENANTS_DIR, '*.db')))
+    else:
+        db_paths = [tenant_db_path(args.tenant)]
+
+    for db_path in db_paths:
+        repository = get_repository(db_path)
+        if args.job == 'purge':
+            print(f'{db_path}: purged {purge_once(repository)} deleted task(s).')
+        elif args.job == 'archive':
+            print(f'{db_path}: archived {archive_once(repository, args.days)} completed task(s).')
+        elif args.job == 'renew':
+            print(f'{db_path}: renewed {renew_once(repository)} recurring task(s).')
+        else:
+            repository.vacuum()
+            print(f'{db_path}: database vacuumed.')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1079 @@
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+import pandas as pd
+
+from db_path import DB_PATH, MAX_OPEN_SHARDS, SHARD_IDLE_SECONDS
+from debug import timed
+from migrations import migrate
+from read_replica import READ_REPLICA, ReadReplica
+from task_scheduler import RECURRENCES, next_due_date
+
+# How many connections each database keeps open for the whole process
+POOL_SIZE = 4
+
+# Seconds a connection waits for a lock before raising "database is locked",
+# and a caller waits for a free pooled connection before "database is busy"
+BUSY_TIMEOUT = 10
+
+# Bytes of the database file each connection reads through a memory map
+MMAP_SIZE = 256 * 1024 * 1024
+
+# Pragmas applied once to every pooled connection.
+# WAL lets readers keep going while a writer commits, and NORMAL sync
+# is safe in WAL mode (only the last commit can be lost on power failure).
+CONNECTION_PRAGMAS = (
+    # only takes effect on a new, empty database (so it must come before the
+    # journal_mode change, which writes the file header): lets the purge job
+    # return freed pages to the OS in small steps instead of a blocking VACUUM
+    'PRAGMA auto_vacuum = INCREMENTAL',
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    f'PRAGMA busy_timeout = {BUSY_TIMEOUT * 1000}',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -16000',  # ~16 MB page cache per connection
+    # reads map the file instead of copying its pages through read() calls
+    f'PRAGMA mmap_size = {MMAP_SIZE}',
+)
+
+# SQL statements are kept as module constants so that every call passes the
+# exact same string and sqlite3 reuses the prepared statement from its cache.
+DATA_VERSION_SQL = 'SELECT version FROM data_version WHERE id = 1'
+INSERT_TASK_SQL = 'INSERT INTO tasks (task, due_date, recurrence) VALUES (?, ?, ?)'
+# Dates are stored as integer Unix epochs (UTC)
+NOW_EPOCH_SQL = "CAST(strftime('%s', 'now') AS INTEGER)"
+# Used by bulk imports, which may carry their own dates (as date strings),
+# status and recurrence. Due dates are kept to their day.
+IMPORT_TASK_SQL = f'''
+INSERT INTO tasks (task, created_date, completed_date, completed, due_date, recurrence)
+VALUES (?,
+        COALESCE(CAST(strftime('%s', ?) AS INTEGER), {NOW_EPOCH_SQL}),
+        CAST(strftime('%s', ?) AS INTEGER),
+        ?,
+        CAST(strftime('%s', ?, 'start of day') AS INTEGER),
+        ?)
+'''
+# Columns shown by the pages. Soft-deleted tasks (deleted_at set) are
+# excluded from every read and update.
+TASK_COLUMNS = 'task_id, task, created_date, completed_date, completed, due_date, recurrence'
+SELECT_TASKS_SQL = f'''
+SELECT {TASK_COLUMNS} FROM tasks
+WHERE deleted_at IS NULL
+ORDER BY created_date DESC, task_id DESC
+'''
+# Exports write the dates as 'YYYY-MM-DD HH:MM:SS' (UTC) and due dates as
+# 'YYYY-MM-DD', as imports expect
+EXPORT_TASKS_SQL = '''
+SELECT task_id, task,
+       datetime(created_date, 'unixepoch') AS created_date,
+       datetime(completed_date, 'unixepoch') AS completed_date,
+       completed,
+       date(due_date, 'unixepoch') AS due_date,
+       recurrence
+FROM tasks
+WHERE deleted_at IS NULL
+ORDER BY tasks.created_date DESC, task_id DESC
+'''
+# Keyset pagination: pages are ordered by (created_date, task_id) descending
+# and the next page starts strictly after the last row of the previous one,
+# so no OFFSET scan is needed however deep the user pages.
+SELECT_FIRST_PAGE_SQL = f'''
+SELECT {TASK_COLUMNS} FROM tasks
+WHERE deleted_at IS NULL
+ORDER BY created_date DESC, task_id DESC
+LIMIT ?
+'''
+SELECT_PAGE_AFTER_SQL = f'''
+SELECT {TASK_COLUMNS} FROM tasks
+WHERE deleted_at IS NULL AND (created_date, task_id) < (?, ?)
+ORDER BY created_date DESC, task_id DESC
+LIMIT ?
+'''
+# Tasks without a created_date (dates migration 008 could not parse, or
+# written by an external tool) come after every dated task, newest first.
+# The keyset comparison above never matches NULL, so they are paged as a
+# section of their own, by task_id. The largest rowid stands for "from the
+# start" (AUTOINCREMENT can never hand it out).
+SELECT_UNDATED_PAGE_SQL = f'''
+SELECT {TASK_COLUMNS} FROM tasks
+WHERE deleted_at IS NULL AND created_date IS NULL AND task_id < ?
+ORDER BY task_id DESC
+LIMIT ?
+'''
+MAX_ROWID = 2 ** 63 - 1
+# Full-text search. Ranking needs the bm25 score of every match, so it is only
+# used while a query matches at most RANKED_SEARCH_MAX_MATCHES tasks; broader
+# queries are listed newest task first straight from the index, which costs
+# the same whatever the number of matches. Ranked pages are keyed by the
+# (rank, task_id) of the last row (bm25 rank is negative, lower is better),
+# newest-first pages by (None, task_id).
+SEARCH_COLUMNS = ', '.join(f'tasks.{column}' for column in TASK_COLUMNS.split(', '))
+COUNT_MATCHES_SQL = '''
+SELECT COUNT(*) FROM (SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ? LIMIT ?)
+'''
+SEARCH_RANKED_SQL = f'''
+SELECT {SEARCH_COLUMNS}, tasks_fts.rank AS rank
+FROM tasks_fts JOIN tasks ON tasks.task_id = tasks_fts.rowid
+WHERE tasks_fts MATCH ? AND tasks.deleted_at IS NULL{{filters}}
+ORDER BY tasks_fts.rank, tasks.task_id
+LIMIT ?
+'''
+SEARCH_RANKED_AFTER_SQL = f'''
+SELECT {SEARCH_COLUMNS}, tasks_fts.rank AS rank
+FROM tasks_fts JOIN tasks ON tasks.task_id = tasks_fts.rowid
+WHERE tasks_fts MATCH ? AND tasks.deleted_at IS NULL{{filters}}
+  AND (tasks_fts.rank, tasks.task_id) > (?, ?)
+ORDER BY tasks_fts.rank, tasks.task_id
+LIMIT ?
+'''
+SEARCH_NEWEST_SQL = f'''
+SELECT {SEARCH_COLUMNS}, NULL AS rank
+FROM tasks_fts JOIN tasks ON tasks.task_id = tasks_fts.rowid
+WHERE tasks_fts MATCH ? AND tasks.deleted_at IS NULL{{filters}}
+ORDER BY tasks_fts.rowid DESC
+LIMIT ?
+'''
+SEARCH_NEWEST_AFTER_SQL = f'''
+SELECT {SEARCH_COLUMNS}, NULL AS rank
+FROM tasks_fts JOIN tasks ON tasks.task_id = tasks_fts.rowid
+WHERE tasks_fts MATCH ? AND tasks.deleted_at IS NULL{{filters}} AND tasks_fts.rowid < ?
+ORDER BY tasks_fts.rowid DESC
+LIMIT ?
+'''
+RANKED_SEARCH_MAX_MATCHES = 10_000
+# Filtered browsing (see TaskFilter). Each sort has a partial index, so pages
+# are read in index order and the keyset condition is an index seek.
+SORT_COLUMNS = {
+    'created_date': 'created_date',
+    'completed_date': 'completed_date',
+    'task': 'task COLLATE NOCASE',
+}
+SELECT_FILTERED_PAGE_SQL = f'''
+SELECT {TASK_COLUMNS} FROM tasks
+WHERE deleted_at IS NULL{{filters}}{{after}}
+ORDER BY {{order}}
+LIMIT ?
+'''
+UPDATE_TASK_SQL = '''
+UPDATE tasks
+SET task = ?, completed = ?, completed_date = ?
+WHERE task_id = ? AND deleted_at IS NULL
+'''
+# Only the fields present in an edited row are changed; a NULL parameter keeps
+# the stored value. completed_date follows the completed flag when it changes.
+# The due date and recurrence can be cleared, so a flag says whether they were edited.
+BATCH_UPDATE_TASK_SQL = '''
+UPDATE tasks
+SET task = COALESCE(:task, task),
+    completed = COALESCE(:completed, completed),
+    completed_date = CASE
+        WHEN :completed IS NULL THEN completed_date
+        WHEN :completed = 1 THEN :completed_date
+        ELSE NULL
+    END,
+    due_date = CASE WHEN :set_due_date THEN :due_date ELSE due_date END,
+    recurrence = CASE WHEN :set_recurrence THEN :recurrence ELSE recurrence END
+WHERE task_id = :task_id AND deleted_at IS NULL
+'''
+# Change log used by incremental snapshot sync
+CHANGE_LOG_BOUNDS_SQL = 'SELECT MIN(change_id), MAX(change_id) FROM task_changes'
+CHANGED_TASK_IDS_SQL = 'SELECT DISTINCT task_id FROM task_changes WHERE change_id > ? AND change_id <= ?'
+# soft-deleted tasks are left out, so the snapshot drops them like deleted ones
+SELECT_TASKS_BY_ID_SQL = f'SELECT {TASK_COLUMNS} FROM tasks WHERE deleted_at IS NULL AND task_id IN ({{placeholders}})'
+PRUNE_CHANGE_LOG_SQL = 'DELETE FROM task_changes WHERE change_id <= ?'
+EXISTING_TASK_IDS_SQL = 'SELECT task_id FROM tasks WHERE deleted_at IS NULL AND task_id IN ({placeholders})'
+# Selection by status. The status variant is a separate statement (rather
+# than ':completed IS NULL OR ...') so it can search the status index.
+# Both are answered from idx_tasks_completed_created_date alone.
+SELECT_TASK_IDS_SQL = 'SELECT task_id FROM tasks WHERE deleted_at IS NULL'
+SELECT_TASK_IDS_BY_STATUS_SQL = 'SELECT task_id FROM tasks WHERE deleted_at IS NULL AND completed = ?'
+# The same narrowed by a TaskFilter and/or a search, as the pages list them
+SELECT_FILTERED_TASK_IDS_SQL = 'SELECT task_id FROM tasks WHERE deleted_at IS NULL{filters}'
+SEARCH_TASK_IDS_SQL = '''
+SELECT tasks.task_id
+FROM tasks_fts JOIN tasks ON tasks.task_id = tasks_fts.rowid
+WHERE tasks_fts MATCH ? AND tasks.deleted_at IS NULL{filters}
+'''
+COUNT_TASKS_SQL = 'SELECT COUNT(*) FROM tasks WHERE deleted_at IS NULL'
+COUNT_TASKS_BY_STATUS_SQL = 'SELECT COUNT(*) FROM tasks WHERE deleted_at IS NULL AND completed = ?'
+# Statistics kept current by triggers (see migrations._007_add_task_stats)
+TASK_TOTALS_SQL = 'SELECT total, completed FROM task_totals WHERE id = 1'
+DAILY_STATS_SQL = '''
+SELECT day, created, completed FROM task_stats_daily
+WHERE day >= ? AND day <= ?
+ORDER BY day
+'''
+DELETE_TASKS_SQL = 'DELETE FROM tasks WHERE task_id IN ({placeholders})'
+SOFT_DELETE_TASKS_SQL = f'''
+UPDATE tasks SET deleted_at = {NOW_EPOCH_SQL}
+WHERE deleted_at IS NULL AND task_id IN ({{placeholders}})
+'''
+# Purge in small batches, oldest soft deletes first, each in its own transaction
+PURGE_DELETED_SQL = f'''
+DELETE FROM tasks WHERE task_id IN (
+    SELECT task_id FROM tasks
+    WHERE deleted_at IS NOT NULL AND deleted_at <= {NOW_EPOCH_SQL} - ?
+    ORDER BY deleted_at
+    LIMIT ?
+)
+'''
+COUNT_SOFT_DELETED_SQL = 'SELECT COUNT(*) FROM tasks WHERE deleted_at IS NOT NULL'
+# Archiving: oldest completions first, found through idx_tasks_completed_completed_date.
+# Recurring tasks wait until they are renewed.
+ARCHIVABLE_TASK_IDS_SQL = f'''
+SELECT task_id FROM tasks
+WHERE deleted_at IS NULL AND completed = 1 AND completed_date <= {NOW_EPOCH_SQL} - ?
+  AND recurrence IS NULL
+ORDER BY completed_date
+LIMIT ?
+'''
+ARCHIVE_TASKS_SQL = f'''
+INSERT INTO tasks_archive (task_id, task, created_date, completed_date, completed,
+                           due_date, recurrence, archived_at)
+SELECT task_id, task, created_date, completed_date, completed,
+       due_date, recurrence, {NOW_EPOCH_SQL}
+FROM tasks WHERE task_id IN ({{placeholders}})
+'''
+# Archived history, paged like the hot tasks
+SELECT_ARCHIVE_FIRST_PAGE_SQL = f'''
+SELECT {TASK_COLUMNS} FROM tasks_archive
+ORDER BY created_date DESC, task_id DESC
+LIMIT ?
+'''
+SELECT_ARCHIVE_PAGE_AFTER_SQL = f'''
+SELECT {TASK_COLUMNS} FROM tasks_archive
+WHERE (created_date, task_id) < (?, ?)
+ORDER BY created_date DESC, task_id DESC
+LIMIT ?
+'''
+SELECT_ARCHIVE_UNDATED_PAGE_SQL = f'''
+SELECT {TASK_COLUMNS} FROM tasks_archive
+WHERE created_date IS NULL AND task_id < ?
+ORDER BY task_id DESC
+LIMIT ?
+'''
+COUNT_ARCHIVED_SQL = 'SELECT COUNT(*) FROM tasks_archive'
+# Due dates (see task_scheduler.py). The open tasks with a due date, in due
+# order, are read straight from idx_tasks_due_date.
+SELECT_DUE_TASKS_SQL = '''
+SELECT task_id, due_date FROM tasks
+WHERE deleted_at IS NULL AND completed = 0 AND due_date IS NOT NULL
+ORDER BY due_date, task_id
+'''
+# Completed recurring tasks waiting to be renewed, from idx_tasks_recurring_completed
+RECURRING_COMPLETED_SQL = '''
+SELECT task_id, task, due_date, completed_date, recurrence FROM tasks
+WHERE deleted_at IS NULL AND recurrence IS NOT NULL AND completed = 1
+LIMIT ?
+'''
+END_RECURRENCE_SQL = 'UPDATE tasks SET recurrence = NULL WHERE task_id = ?'
+
+# Stay well below SQLite's limit on the number of ? parameters per statement
+MAX_SQL_PARAMS = 500
+
+
+def _open_connection(db_path):
+    # check_same_thread=False because Streamlit runs every session in its own
+    # thread; the pool guarantees a connection is used by one thread at a time.
+    conn = sqlite3.connect(db_path,
+                           timeout=BUSY_TIMEOUT,
+                           check_same_thread=False,
+                           cached_statements=256)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _read_df(conn, sql, params=()):
+    """Run a query and build a DataFrame, timing the two steps separately."""
+    with timed('query'):
+        cursor = conn.execute(sql, params)
+        rows = cursor.fetchall()
+    with timed('dataframe'):
+        return pd.DataFrame.from_records(rows, columns=[column[0] for column in cursor.description])
+
+
+def fts_query(text):
+    """
+    Turn what the user typed into an FTS5 query: "quoted text" is matched as
+    a phrase and every other word as a prefix, and all of them must match.
+    Every term is quoted, so no input can be an FTS5 syntax error.
+    Returns None when there is nothing to search for.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text or ''):
+        term = (phrase or word).replace('"', '').strip()
+        # skip terms with nothing the tokenizer would index (e.g. a lone '-')
+        if not re.search(r'\w', term):
+            continue
+        terms.append(f'"{term}"' if phrase else f'"{term}"*')
+    return ' '.join(terms) or None
+
+
+@dataclass(frozen=True)
+class TaskFilter:
+    """
+    Status, date-range and sort options for browsing tasks. Dates are Unix
+    epochs (UTC): the *_from bounds are inclusive, the *_to bounds exclusive.
+    Frozen and hashable, so cached loaders can take it as an argument and
+    keep every filter combination apart.
+    """
+    completed: bool | None = None
+    created_from: int | None = None
+    created_to: int | None = None
+    completed_from: int | None = None
+    completed_to: int | None = None
+    sort: str = 'created_date'
+    descending: bool = True
+
+    def __post_init__(self):
+        if self.sort not in SORT_COLUMNS:
+            raise ValueError(f'cannot sort tasks by {self.sort!r}')
+
+    @property
+    def is_default(self):
+        return self == DEFAULT_FILTER
+
+    def where(self, table='tasks'):
+        """SQL conditions (each starting with AND) and their parameters."""
+        conditions, params = [], []
+        if self.completed is not None:
+            conditions.append(f'{table}.completed = ?')
+            params.append(int(self.completed))
+        for column, low, high in (('created_date', self.created_from, self.created_to),
+                                  ('completed_date', self.completed_from, self.completed_to)):
+            if low is not None:
+                conditions.append(f'{table}.{column} >= ?')
+                params.append(int(low))
+            if high is not None:
+                conditions.append(f'{table}.{column} < ?')
+                params.append(int(high))
+        return ''.join(f' AND {condition}' for condition in conditions), params
+
+    def page_sql(self, after):
+        """The SELECT of one page in this filter's order, and its parameters before LIMIT."""
+        filters, params = self.where()
+        column = SORT_COLUMNS[self.sort]
+        direction = 'DESC' if self.descending else 'ASC'
+        # tasks never completed have no completed_date: they come last newest
+        # first and first oldest first, as SQLite orders NULLs
+        order = f'{column} {direction}, task_id {direction}'
+        keyset = ''
+        if after is not None:
+            value, task_id = after
+            if value is None:
+                # inside the NULLs, or past them
+                if self.descending:
+                    keyset = f' AND {self.sort} IS NULL AND task_id < ?'
+                else:
+                    keyset = f' AND (({self.sort} IS NULL AND task_id > ?) OR {self.sort} IS NOT NULL)'
+                params.append(task_id)
+            elif self.descending:
+                keyset = f' AND (({column}, task_id) < (?, ?) OR {self.sort} IS NULL)'
+                params.extend((value, task_id))
+            else:
+                keyset = f' AND ({column}, task_id) > (?, ?)'
+                params.extend((value, task_id))
+        sql = SELECT_FILTERED_PAGE_SQL.format(filters=filters, after=keyset, order=order)
+        return sql, params
+
+DEFAULT_FILTER = TaskFilter()
+
+
+def _search_page(conn, match, limit, after, task_filter=DEFAULT_FILTER):
+    """One page of search results, ranked or newest first (see RANKED_SEARCH_MAX_MATCHES)."""
+    # search results keep their own order; only the status and date filters apply
+    filters, params = task_filter.where()
+    if after is None:
+        # rank only when it is cheap: a bounded count of the matches decides
+        matches = conn.execute(COUNT_MATCHES_SQL,
+                               (match, RANKED_SEARCH_MAX_MATCHES + 1)).fetchone()[0]
+        sql = SEARCH_RANKED_SQL if matches <= RANKED_SEARCH_MAX_MATCHES else SEARCH_NEWEST_SQL
+        return _read_df(conn, sql.format(filters=filters), (match, *params, limit))
+    # later pages keep the order chosen for the first one
+    rank, task_id = after
+    if rank is None:
+        return _read_df(conn, SEARCH_NEWEST_AFTER_SQL.format(filters=filters),
+                        (match, *params, task_id, limit))
+    return _read_df(conn, SEARCH_RANKED_AFTER_SQL.format(filters=filters),
+                    (match, *params, rank, task_id, limit))
+
+
+def _newest_first_page(conn, after, limit, first_sql, after_sql, undated_sql):
+    """
+    One page of tasks newest first (see SELECT_UNDATED_PAGE_SQL). A page
+    that runs out of dated tasks goes on with the undated ones.
+    """
+    if after is None:
+        # ORDER BY already puts the NULL dates last
+        return _read_df(conn, first_sql, (limit,))
+    created_date, task_id = after
+    if created_date is None:
+        return _read_df(conn, undated_sql, (task_id, limit))
+    df = _read_df(conn, after_sql, (created_date, task_id, limit))
+    if limit < 0 or len(df) < limit:
+        undated = _read_df(conn, undated_sql, (MAX_ROWID, limit if limit < 0 else limit - len(df)))
+        if not undated.empty:
+            df = undated if df.empty else pd.concat([df, undated], ignore_index=True)
+    return df
+
+
+def _cursor_value(value):
+    # NULL sort values (NaN once in a DataFrame) are None in a cursor
+    return None if pd.isna(value) else _scalar(value)
+
+
+def _epoch(value):
+    """Unix epoch seconds of a datetime (naive ones are taken as UTC), or None."""
+    if value is None or pd.isna(value):
+        return None
+    return int(pd.Timestamp(value).timestamp())
+
+
+def _due_epoch(value):
+    """
+    Epoch of the day (midnight UTC) of a due date, or None. Takes a date or
+    datetime, a date string or an integer epoch; anything else (a float, a
+    bool) raises TypeError instead of being read as some other day.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str, date)):
+        raise TypeError(f'not a due date: {value!r}')
+    epoch = value if isinstance(value, int) else _epoch(value)
+    return None if epoch is None else epoch - epoch % (24 * 3600)
+
+
+def _check_recurrence(recurrence):
+    if recurrence is not None and recurrence not in RECURRENCES:
+        raise ValueError(f'recurrence must be one of {", ".join(RECURRENCES)}')
+
+
+def _scalar(value):
+    # numpy scalars from a DataFrame row -> plain Python values sqlite3 can bind
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _chunks(items, size=MAX_SQL_PARAMS):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+@dataclass
+class BatchResult:
+    """Outcome of a batch write: rows applied and the reason each failed row was rejected."""
+    applied: int = 0
+    failures: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return not self.failures
+
+
+### WRITES ###
+# The write statements run on a connection inside a transaction opened by the
+# caller: the TaskRepository methods below (one transaction each) or the write
+# queue, which group-commits many of them in one transaction. None of them
+# commits or rolls back.
+
+def insert_task(conn, task: str, due_date=None, recurrence: str | None = None) -> int:
+    """Insert a task, optionally due on a day and recurring, and return its new task_id."""
+    _check_recurrence(recurrence)
+    return conn.execute(INSERT_TASK_SQL, (task, _due_epoch(due_date), recurrence)).lastrowid
+
+def insert_tasks(conn, tasks: list[str]) -> int:
+    """Insert many tasks with one executemany. Returns the number inserted."""
+    conn.executemany(INSERT_TASK_SQL, [(task, None, None) for task in tasks])
+    return len(tasks)
+
+def insert_imported(conn, rows: list[tuple]) -> int:
+    """
+    Insert one chunk of imported (task, created_date, completed_date,
+    completed, due_date, recurrence) rows with one executemany. Returns the
+    number inserted.
+    """
+    conn.executemany(IMPORT_TASK_SQL, rows)
+    return len(rows)
+
+def apply_updates(conn, updates: dict) -> BatchResult:
+    """
+    Apply many edited rows (see TaskRepository.update_tasks). Every row is
+    checked before anything is written, so on failure nothing was changed.
+    """
+    result = BatchResult()
+    completed_date = int(time.time())
+    params = {}
+
+    for row_key, changes in updates.items():
+        task_id = changes.get('task_id')
+        if task_id is None or pd.isna(task_id):
+            result.failures[row_key] = 'task_id is missing'
+            continue
+        task = changes.get('task')
+        if 'task' in changes and (task is None or not str(task).strip()):
+            result.failures[row_key] = 'task description cannot be empty'
+            continue
+        try:
+            due_date = _due_epoch(changes.get('due_date'))
+        except (TypeError, ValueError):
+            result.failures[row_key] = 'due date is not a date'
+            continue
+        recurrence = changes.get('recurrence') or None
+        try:
+            _check_recurrence(recurrence)
+        except ValueError as e:
+            result.failures[row_key] = str(e)
+            continue
+        completed = changes.get('completed')
+        params[row_key] = {
+            'task_id': int(task_id),
+            'task': task,
+            'completed': None if completed is None else int(bool(completed)),
+            'completed_date': completed_date,
+            'set_due_date': 'due_date' in changes,
+            'due_date': due_date,
+            'set_recurrence': 'recurrence' in changes,
+            'recurrence': recurrence,
+        }
+
+    if result.failures or not params:
+        return result
+
+    task_ids = [row['task_id'] for row in params.values()]
+    existing = set()
+    for chunk in _chunks(task_ids):
+        placeholders = ','.join('?' for _ in chunk)
+        existing.update(task_id for (task_id,) in conn.execute(
+            EXISTING_TASK_IDS_SQL.format(placeholders=placeholders), chunk))
+
+    for row_key, row in params.items():
+        if row['task_id'] not in existing:
+            result.failures[row_key] = f"task {row['task_id']} does not exist"
+    if result.failures:
+        return result
+
+    conn.executemany(BATCH_UPDATE_TASK_SQL, list(params.values()))
+    result.applied = len(params)
+    return result
+
+def remove_tasks(conn, task_ids: list[int], soft: bool = False) -> int:
+    """Delete (or with soft=True mark deleted) the given tasks. Returns rows affected."""
+    sql = SOFT_DELETE_TASKS_SQL if soft else DELETE_TASKS_SQL
+    removed = 0
+    for chunk in _chunks([int(task_id) for task_id in task_ids]):
+        placeholders = ','.join('?' for _ in chunk)
+        removed += conn.execute(sql.format(placeholders=placeholders), chunk).rowcount
+    return removed
+
+
+class TaskRepository:
+    """
+    Data-access layer for the tasks table.
+    Keeps a small pool of connections that are opened once and shared by
+    every Streamlit session in the process. The schema is migrated to the
+    latest version when the repository is created. With read_replica, the
+    read-only queries run on an in-memory copy of the database while it is
+    current (see read_replica.py).
+    """
+
+    def __init__(self, db_path=DB_PATH, pool_size=POOL_SIZE, read_replica=False):
+        self.db_path = db_path
+        self.closed = False
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        for _ in range(pool_size):
+            self._pool.put(_open_connection(db_path))
+        with self.connection() as conn:
+            self.migrations_applied = migrate(conn)
+        self.replica = ReadReplica(self.connection, DATA_VERSION_SQL) if read_replica else None
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a pooled connection; it goes back to the pool afterwards.
+        Raises sqlite3.OperationalError if none is free within BUSY_TIMEOUT.
+        """
+        if self.closed:
+            raise sqlite3.ProgrammingError(f'Cannot operate on a closed repository ({self.db_path}).')
+        with timed('connect'):
+            try:
+                # like a lock wait, a wait for a free connection is bounded
+                conn = self._pool.get(timeout=BUSY_TIMEOUT)
+            except queue.Empty:
+                raise sqlite3.OperationalError(
+                    f'database is busy: no pooled connection was free after {BUSY_TIMEOUT} s '
+                    f'(pool of {self._pool.maxsize})') from None
+        try:
+            yield conn
+        finally:
+            # never hand a connection with an open transaction to the next user
+            if conn.in_transaction:
+                conn.rollback()
+            if self.closed:
+                # borrowed while the repository was being closed
+                conn.close()
+            else:
+                self._pool.put(conn)
+
+    @contextmanager
+    def reading(self):
+        """
+        Connection for read-only queries: one to the in-memory replica when
+        it is at the database's current version, else a pooled one.
+        """
+        if self.replica is not None:
+            with self.replica.connection(self.data_version()) as conn:
+                if conn is not None:
+                    yield conn
+                    return
+        with self.connection() as conn:
+            yield conn
+
+    @contextmanager
+    def transaction(self):
+        """Borrow a connection and commit on success, roll back on error."""
+        with self.connection() as conn:
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def close(self):
+        self.closed = True
+        if self.replica is not None:
+            self.replica.close()
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+    ### DATA VERSION ###
+    def data_version(self) -> int:
+        """
+        Return the database change counter, bumped by triggers on every
+        insert, update or delete. Caches keyed on it are shared by all
+        sessions and invalidated as soon as anyone writes.
+        """
+        with self.connection() as conn:
+            return conn.execute(DATA_VERSION_SQL).fetchone()[0]
+
+    ### CREATE ###
+    def create_task(self, task: str, due_date=None, recurrence: str | None = None) -> int:
+        """Insert a task and return its new task_id."""
+        with self.transaction() as conn:
+            return insert_task(conn, task, due_date, recurrence)
+
+    def create_tasks(self, tasks: list[str]) -> int:
+        """Insert many tasks with one executemany in a single transaction."""
+        with self.transaction() as conn:
+            return insert_tasks(conn, tasks)
+
+    def import_tasks(self, chunks, progress=None) -> int:
+        """
+        Insert many tasks in a single transaction, one executemany per chunk.
+        chunks yields lists of (task, created_date, completed_date, completed,
+        due_date, recurrence) tuples; progress, if given, is called with the running row count after
+        each chunk. Nothing is inserted if any chunk fails.
+        Returns the number of rows inserted.
+        This holds the write lock for the whole load: it is meant for
+        seeding a database nobody else is writing to. The app imports
+        through the write queue (see bulk_io.import_tasks()).
+        """
+        inserted = 0
+        with self.transaction() as conn:
+            for chunk in chunks:
+                inserted += insert_imported(conn, chunk)
+                if progress is not None:
+                    progress(inserted)
+        return inserted
+
+    ### READ ###
+    def read_tasks(self) -> pd.DataFrame:
+        """Return all tasks, newest first, exactly as stored in the table."""
+        with self.reading() as conn:
+            return _read_df(conn, SELECT_TASKS_SQL)
+
+    def iter_tasks(self, chunk_size: int = 5000):
+        """
+        Yield (column names, list of row tuples) chunks of every task, newest
+        first, straight from a cursor without building a DataFrame.
+        Dates come as 'YYYY-MM-DD HH:MM:SS' strings, ready to be written out.
+        """
+        with self.reading() as conn:
+            cursor = conn.execute(EXPORT_TASKS_SQL)
+            columns = [column[0] for column in cursor.description]
+            while rows := cursor.fetchmany(chunk_size):
+                yield columns, rows
+
+    def count_tasks(self, completed: bool | None = None) -> int:
+        """Count live tasks, optionally only completed (True) or pending (False) ones."""
+        with self.reading() as conn:
+            if completed is None:
+                return conn.execute(COUNT_TASKS_SQL).fetchone()[0]
+            return conn.execute(COUNT_TASKS_BY_STATUS_SQL, (int(completed),)).fetchone()[0]
+
+    def select_task_ids(self, completed: bool | None = None, search: str | None = None,
+                        task_filter: TaskFilter | None = None) -> list[int]:
+        """
+        IDs of live tasks, optionally only completed (True) or pending (False)
+        ones, and only those matching the search text and task_filter, like
+        the pages of read_page().
+        """
+        task_filter = task_filter or DEFAULT_FILTER
+        match = fts_query(search) if search else None
+        if search and match is None:
+            return []
+        with self.reading() as conn:
+            if match is None and task_filter.is_default:
+                if completed is None:
+                    cursor = conn.execute(SELECT_TASK_IDS_SQL)
+                else:
+                    cursor = conn.execute(SELECT_TASK_IDS_BY_STATUS_SQL, (int(completed),))
+            else:
+                filters, params = task_filter.where()
+                if completed is not None:
+                    filters += ' AND tasks.completed = ?'
+                    params.append(int(completed))
+                if match is None:
+                    cursor = conn.execute(SELECT_FILTERED_TASK_IDS_SQL.format(filters=filters), params)
+                else:
+                    cursor = conn.execute(SEARCH_TASK_IDS_SQL.format(filters=filters), (match, *params))
+            return [task_id for (task_id,) in cursor]
+
+    def read_page(self, page_size: int | None, after: tuple | None = None,
+                  search: str | None = None,
+                  task_filter: TaskFilter | None = None) -> tuple[pd.DataFrame, tuple | None]:
+        """
+        Return one page of tasks and the cursor of the next page.
+        Without search, tasks come newest first and after is the
+        (created_date, task_id) of the previous page's last row. With search
+        text, only matching tasks are returned, best match first (newest first
+        for very broad queries), and after is the (rank, task_id) cursor of
+        the previous page. after is None for the first page and the next
+        cursor is None on the last page. page_size None returns every row.
+        task_filter narrows the tasks by status and dates and, without
+        search, sets the order; the cursor is then (sort value, task_id).
+        """
+        task_filter = task_filter or DEFAULT_FILTER
+        # fetch one extra row to know whether there is a next page
+        limit = -1 if page_size is None else page_size + 1
+
+        if search:
+            match = fts_query(search)
+            if match is None:
+                return pd.DataFrame(columns=TASK_COLUMNS.split(', ')), None
+            with self.reading() as conn:
+                df = _search_page(conn, match, limit, after, task_filter)
+            cursor_columns = ['rank', 'task_id']
+        elif not task_filter.is_default:
+            sql, params = task_filter.page_sql(after)
+            with self.reading() as conn:
+                df = _read_df(conn, sql, (*params, limit))
+            cursor_columns = [task_filter.sort, 'task_id']
+        else:
+            with self.reading() as conn:
+                df = _newest_first_page(conn, after, limit, SELECT_FIRST_PAGE_SQL,
+                                        SELECT_PAGE_AFTER_SQL, SELECT_UNDATED_PAGE_SQL)
+            cursor_columns = ['created_date', 'task_id']
+
+        next_cursor = None
+        if page_size is not None and len(df) > page_size:
+            df = df.iloc[:page_size]
+            last = df.iloc[-1]
+            next_cursor = (_cursor_value(last[cursor_columns[0]]), int(last['task_id']))
+        if search:
+            df = df.drop(columns='rank')
+        return df, next_cursor
+
+    def read_tasks_by_id(self, task_ids: list[int]) -> pd.DataFrame:
+        """Return the live tasks with the given IDs (missing ones are left out)."""
+        task_ids = [int(task_id) for task_id in task_ids]
+        frames = []
+        with self.reading() as conn:
+            for chunk in _chunks(task_ids):
+                placeholders = ','.join('?' for _ in chunk)
+                frames.append(_read_df(
+                    conn, SELECT_TASKS_BY_ID_SQL.format(placeholders=placeholders), chunk))
+        if not frames:
+            return pd.DataFrame(columns=TASK_COLUMNS.split(', '))
+        return pd.concat(frames, ignore_index=True)
+
+    def read_all_with_change_id(self) -> tuple[pd.DataFrame, int]:
+        """
+        Return all tasks together with the change_id they are current as of,
+        read in one transaction so the two are consistent.
+        """
+        with self.connection() as conn:
+            conn.execute('BEGIN')
+            df = _read_df(conn, SELECT_TASKS_SQL)
+            last_change_id = conn.execute(CHANGE_LOG_BOUNDS_SQL).fetchone()[1] or 0
+            conn.rollback()
+        return df, last_change_id
+
+    def last_change_id(self) -> int:
+        with self.connection() as conn:
+            return conn.execute(CHANGE_LOG_BOUNDS_SQL).fetchone()[1] or 0
+
+    def read_changes(self, since: int) -> tuple[list[int], pd.DataFrame, int] | None:
+        """
+        Return the tasks changed after change_id `since`:
+        (changed task_ids, current rows of those still present, new change_id).
+        Returns None if the log was pruned past `since`, in which case the
+        caller must do a full reload.
+        """
+        with self.connection() as conn:
+            # one read transaction, so the log and the rows are from the same snapshot
+            conn.execute('BEGIN')
+            try:
+                first, last = conn.execute(CHANGE_LOG_BOUNDS_SQL).fetchone()
+                last = last or since
+                if first is not None and first > since + 1:
+                    return None
+                changed_ids = [task_id for (task_id,) in
+                               conn.execute(CHANGED_TASK_IDS_SQL, (since, last))]
+                frames = []
+                for chunk in _chunks(changed_ids):
+                    placeholders = ','.join('?' for _ in chunk)
+                    frames.append(_read_df(
+                        conn, SELECT_TASKS_BY_ID_SQL.format(placeholders=placeholders), chunk))
+            finally:
+                conn.rollback()
+
+        rows = pd.concat(frames, ignore_index=True) if frames else None
+        return changed_ids, rows, last
+
+    def prune_change_log(self, keep: int) -> int:
+        """Delete all but the newest `keep` change log entries. Returns rows deleted."""
+        with self.transaction() as conn:
+            last = conn.execute(CHANGE_LOG_BOUNDS_SQL).fetchone()[1] or 0
+            return conn.execute(PRUNE_CHANGE_LOG_SQL, (last - keep,)).rowcount
+
+    ### STATISTICS ###
+    def task_totals(self) -> tuple[int, int]:
+        """(live tasks, completed tasks), read from the running totals."""
+        with self.reading() as conn:
+            return conn.execute(TASK_TOTALS_SQL).fetchone()
+
+    def daily_stats(self, first_day: str, last_day: str) -> pd.DataFrame:
+        """
+        Tasks created and completed per day between two 'YYYY-MM-DD' days,
+        inclusive. Days without any activity have no row.
+        """
+        with self.reading() as conn:
+            return _read_df(conn, DAILY_STATS_SQL, (first_day, last_day))
+
+    ### UPDATE ###
+    def update_task(self, task_id: int, task: str, completed: bool,
+                    completed_date: datetime | None) -> int:
+        """Update a single task. Returns the number of rows affected."""
+        with self.transaction() as conn:
+            cursor = conn.execute(UPDATE_TASK_SQL,
+                                  (task, int(bool(completed)),
+                                   _epoch(completed_date), int(task_id)))
+            return cursor.rowcount
+
+    def update_tasks(self, updates: dict) -> BatchResult:
+        """
+        Apply many edited rows in a single transaction.
+        updates maps a caller-chosen row key (e.g. the data editor row index)
+        to a dict with 'task_id' plus the changed 'task', 'completed',
+        'due_date' and/or 'recurrence' (None clears the last two).
+        All-or-nothing: if any row is invalid or missing nothing is written and
+        the failures are reported per row key.
+        """
+        with self.transaction() as conn:
+            return apply_updates(conn, updates)
+
+    ### DELETE ###
+    def delete_tasks(self, task_ids: list[int], soft: bool = False) -> int:
+        """
+        Delete the given tasks. Returns the number of rows deleted.
+        The IDs are processed in chunks of MAX_SQL_PARAMS, each in its own
+        short transaction, so any selection size stays under SQLite's
+        parameter limit and other writers get the lock between chunks.
+        With soft=True the tasks are only marked deleted, which is a cheap
+        UPDATE; purge_deleted() removes them later.
+        """
+        task_ids = [int(task_id) for task_id in task_ids]
+        deleted = 0
+        for chunk in _chunks(task_ids):
+            with self.transaction() as conn:
+                deleted += remove_tasks(conn, chunk, soft)
+        return deleted
+
+    def count_soft_deleted(self) -> int:
+        with self.connection() as conn:
+            return conn.execute(COUNT_SOFT_DELETED_SQL).fetchone()[0]
+
+    def purge_deleted(self, older_than_seconds: int = 0, batch_size: int = MAX_SQL_PARAMS,
+                      pause: float = 0.0) -> int:
+        """
+        Permanently remove tasks soft-deleted at least older_than_seconds ago,
+        batch_size rows per transaction, sleeping `pause` seconds between
+        batches so interactive writers are never blocked for long.
+        Returns the number of rows purged.
+        """
+        purged = 0
+        while True:
+            with self.transaction() as conn:
+                batch = conn.execute(PURGE_DELETED_SQL,
+                                     (int(older_than_seconds), batch_size)).rowcount
+            purged += batch
+            if batch < batch_size:
+                return purged
+            time.sleep(pause)
+
+    ### ARCHIVE ###
+    def archive_completed(self, older_than_seconds: int, batch_size: int = MAX_SQL_PARAMS,
+                          pause: float = 0.0) -> int:
+        """
+        Move tasks completed at least older_than_seconds ago from tasks to
+        tasks_archive, batch_size tasks per transaction with `pause` seconds
+        between batches, like purge_deleted(). Returns the number archived.
+        """
+        archived = 0
+        while True:
+            with self.transaction() as conn:
+                # take the write lock before choosing the batch
+                conn.execute('BEGIN IMMEDIATE')
+                task_ids = [task_id for (task_id,) in conn.execute(
+                    ARCHIVABLE_TASK_IDS_SQL, (int(older_than_seconds), batch_size))]
+                for chunk in _chunks(task_ids):
+                    placeholders = ','.join('?' for _ in chunk)
+                    conn.execute(ARCHIVE_TASKS_SQL.format(placeholders=placeholders), chunk)
+                    conn.execute(DELETE_TASKS_SQL.format(placeholders=placeholders), chunk)
+            archived += len(task_ids)
+            if len(task_ids) < batch_size:
+                return archived
+            time.sleep(pause)
+
+    def read_archive_page(self, page_size: int | None,
+                          after: tuple | None = None) -> tuple[pd.DataFrame, tuple | None]:
+        """One page of archived tasks, newest first; same cursors as read_page()."""
+        limit = -1 if page_size is None else page_size + 1
+        with self.reading() as conn:
+            df = _newest_first_page(conn, after, limit, SELECT_ARCHIVE_FIRST_PAGE_SQL,
+                                    SELECT_ARCHIVE_PAGE_AFTER_SQL, SELECT_ARCHIVE_UNDATED_PAGE_SQL)
+
+        if page_size is None or len(df) <= page_size:
+            return df, None
+        df = df.iloc[:page_size]
+        last = df.iloc[-1]
+        return df, (_cursor_value(last['created_date']), int(last['task_id']))
+
+    def count_archived(self) -> int:
+        with self.reading() as conn:
+            return conn.execute(COUNT_ARCHIVED_SQL).fetchone()[0]
+
+    ### DUE DATES ###
+    def read_due_with_change_id(self) -> tuple[list[tuple[int, int]], int]:
+        """
+        (task_id, due_date) of every open task with a due date, earliest
+        first, and the change_id they are current as of (see read_all_with_change_id()).
+        """
+        with self.connection() as conn:
+            conn.execute('BEGIN')
+            due_tasks = conn.execute(SELECT_DUE_TASKS_SQL).fetchall()
+            last_change_id = conn.execute(CHANGE_LOG_BOUNDS_SQL).fetchone()[1] or 0
+            conn.rollback()
+        return due_tasks, last_change_id
+
+    def renew_recurring(self, batch_size: int = MAX_SQL_PARAMS, pause: float = 0.0) -> int:
+        """
+        Add the next occurrence of every completed recurring task, due one
+        period after it (see task_scheduler.next_due_date()), and stop the
+        completed one from recurring, batch_size tasks per transaction like
+        archive_completed(). Returns the number of tasks added.
+        """
+        renewed = 0
+        while True:
+            now = int(time.time())
+            with self.transaction() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                rows = conn.execute(RECURRING_COMPLETED_SQL, (batch_size,)).fetchall()
+                # tasks without a due date repeat from the day they were completed
+                conn.executemany(INSERT_TASK_SQL, [
+                    (task, next_due_date(_due_epoch(due if due is not None else completed or now),
+                                         recurrence, now), recurrence)
+                    for _, task, due, completed, recurrence in rows])
+                conn.executemany(END_RECURRENCE_SQL, [(task_id,) for task_id, *_ in rows])
+            renewed += len(rows)
+            if len(rows) < batch_size:
+                return renewed
+            time.sleep(pause)
+
+    def incremental_vacuum(self, pages: int = 1000) -> None:
+        """
+        Return up to `pages` free pages to the file system. Only does something
+        on databases created with auto_vacuum = INCREMENTAL; older databases
+        need a one-off `python task_maintenance.py vacuum`.
+        """
+        with self.connection() as conn:
+            # execute() would only step the pragma once, freeing a single page
+            conn.executescript(f'PRAGMA incremental_vacuum({int(pages)})')
+
+    def vacuum(self) -> None:
+        """
+        Rebuild the database file and switch it to incremental auto-vacuum.
+        This takes an exclusive lock for its whole duration: run it off-hours.
+        """
+        with self.connection() as conn:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+
+
+### PROCESS-WIDE REPOSITORIES ###
+# One repository per database file, in least recently used order. Beyond
+# MAX_OPEN_SHARDS tenant shards, the idle ones unused for longest are closed
+# (the shared DB_PATH always stays open) together with everything other
+# modules keep per shard: they register a closer with on_shard_closed().
+_repositories = OrderedDict()
+_last_used = {}
+_repositories_lock = threading.Lock()
+_shard_closers = []
+
+def on_shard_closed(closer):
+    """
+    Call closer(db_path, repository) for every shard closed for being idle,
+    before its repository is closed.
+    """
+    _shard_closers.append(closer)
+
+def get_repository(db_path=DB_PATH, create=True) -> TaskRepository | None:
+    """
+    Return the shared repository for db_path, opening it on first use.
+    With create=False, a tenant shard that does not exist yet is not
+    created and None is returned: there is nothing to read from it.
+    """
+    now = time.monotonic()
+    with _repositories_lock:
+        repository = _repositories.get(db_path)
+        if repository is not None:
+            _repositories.move_to_end(db_path)
+            _last_used[db_path] = now
+            return repository
+        if not create and db_path != DB_PATH and not os.path.exists(db_path):
+            return None
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        repository = _repositories[db_path] = TaskRepository(db_path, read_replica=READ_REPLICA)
+        _last_used[db_path] = now
+        idle = {}
+        shards = [path for path in _repositories if path != DB_PATH]
+        for path in shards[:max(0, len(shards) - MAX_OPEN_SHARDS)]:
+            if now - _last_used[path] < SHARD_IDLE_SECONDS:
+                break  # and so are all the more recently used ones
+            idle[path] = _repositories.pop(path)
+            del _last_used[path]
+    # closers may wait for queued writes: not while holding up every lookup
+    for path, idle_repository in idle.items():
+        for closer in _shard_closers:
+            closer(path, idle_repository)
+        idle_repository.close()
+    return repository
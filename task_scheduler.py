@@ -0,0 +1,163 @@
+"""
+Due dates, recurring tasks and the next-due queue.
+
+A task can have a due date (a day, stored as the Unix epoch of midnight UTC)
+and a recurrence. The pages show which open tasks are overdue, due today or
+due soon. Instead of scanning every task on each rerun, a TaskScheduler per
+database keeps the open tasks that have a due date in a list sorted by due
+date. It is filled once from the partial due-date index and then kept
+current from the task change log, like the snapshot, so a write costs one
+row read and one insertion. The due-date views find the bounds of their
+window by binary search: counts take O(log n) and a page costs that plus
+the rows it returns, however many tasks are overdue.
+
+Recurring tasks are renewed in batches by the maintenance worker: once a
+recurring task is completed, a new task due one period later is added and
+the completed one stops recurring (TaskRepository.renew_recurring).
+"""
+import bisect
+import calendar
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+
+from debug import timed
+
+# How tasks can repeat, and the length of the fixed periods
+RECURRENCES = ('daily', 'weekly', 'monthly')
+PERIOD_SECONDS = {'daily': 24 * 3600, 'weekly': 7 * 24 * 3600}
+
+# "Due soon" is the days after today, up to this many
+DUE_SOON_DAYS = 7
+
+# Changes applied at once past which the queue is sorted again from scratch
+REBUILD_CHANGES = 5000
+
+
+def day_epoch(day: date) -> int:
+    """Unix epoch of the start (midnight UTC) of a day."""
+    return int(datetime.combine(day, time(), tzinfo=timezone.utc).timestamp())
+
+def due_windows(today: date) -> dict:
+    """[start, end) epochs of the overdue, due today and due soon views."""
+    start, tomorrow = day_epoch(today), day_epoch(today + timedelta(days=1))
+    return {
+        'overdue': (None, start),
+        'today': (start, tomorrow),
+        'soon': (tomorrow, day_epoch(today + timedelta(days=1 + DUE_SOON_DAYS))),
+    }
+
+def _add_month(epoch):
+    day = datetime.fromtimestamp(epoch, timezone.utc)
+    year, month = divmod(day.month, 12)
+    year, month = day.year + year, month + 1
+    # the 31st becomes the last day of shorter months
+    return int(day.replace(year=year, month=month,
+                           day=min(day.day, calendar.monthrange(year, month)[1])).timestamp())
+
+def next_due_date(due, recurrence, now):
+    """
+    Due date of the next occurrence of a recurring task due at `due`: one
+    period later, or the first occurrence after `now` for a task renewed
+    late, so a missed week does not come back as a pile of overdue tasks.
+    """
+    if recurrence not in RECURRENCES:
+        raise ValueError(f'unknown recurrence {recurrence!r}')
+    if recurrence in PERIOD_SECONDS:
+        period = PERIOD_SECONDS[recurrence]
+        return due + period * max(1, (now - due) // period + 1)
+    due = _add_month(due)
+    while due <= now:
+        due = _add_month(due)
+    return due
+
+
+class TaskScheduler:
+    """
+    Sorted list of the (due date, task_id) of a database's open tasks with
+    a due date, kept current incrementally. Only live entries are kept, so
+    the bounds of a due window are found by binary search: counting a
+    window is O(log n) and a page costs O(log n) plus its rows, whatever
+    the number of overdue tasks.
+    """
+
+    def __init__(self, repository):
+        self.repository = repository
+        self.change_id = None
+        self._due = {}      # task_id -> due date of every queued task
+        self._queue = []    # sorted (due date, task_id) of the same tasks
+        self._lock = threading.Lock()
+
+    def sync(self):
+        """Bring the queue up to date with the database."""
+        with self._lock, timed('scheduler sync'):
+            if self.change_id is None:
+                self._full_reload()
+            elif self.repository.last_change_id() != self.change_id:
+                changes = self.repository.read_changes(self.change_id)
+                if changes is None:
+                    self._full_reload()
+                else:
+                    self._apply_changes(*changes)
+        return self
+
+    def _full_reload(self):
+        due_tasks, self.change_id = self.repository.read_due_with_change_id()
+        # read in (due date, task_id) order from the index: already sorted
+        self._queue = [(due, task_id) for task_id, due in due_tasks]
+        self._due = {task_id: due for task_id, due in due_tasks}
+
+    def _apply_changes(self, changed_ids, rows, change_id):
+        current = {}
+        if rows is not None:
+            for task_id, due, completed in rows[['task_id', 'due_date', 'completed']].itertuples(index=False):
+                # NULL due dates come back as NaN (which is not equal to itself)
+                if not completed and due == due and due is not None:
+                    current[int(task_id)] = int(due)
+        # an insert or removal moves the tail of the list: past a few
+        # thousand changes, sorting the whole queue again is cheaper
+        rebuild = len(changed_ids) > REBUILD_CHANGES
+        for task_id in changed_ids:
+            old, due = self._due.get(task_id), current.get(task_id)
+            if old == due:
+                continue
+            if not rebuild and old is not None:
+                del self._queue[bisect.bisect_left(self._queue, (old, task_id))]
+            if due is None:
+                del self._due[task_id]
+            else:
+                self._due[task_id] = due
+                if not rebuild:
+                    bisect.insort(self._queue, (due, task_id))
+        if rebuild:
+            self._queue = sorted((due, task_id) for task_id, due in self._due.items())
+        self.change_id = change_id
+
+    def _bounds(self, start, end):
+        """Positions in the queue of the first entry due at start or later, and of the first due at end."""
+        first = 0 if start is None else bisect.bisect_left(self._queue, (start,))
+        last = len(self._queue) if end is None else bisect.bisect_left(self._queue, (end,))
+        return first, last
+
+    def due(self, start=None, end=None, limit=None, after=None):
+        """
+        (due date, task_id) of the tasks due in [start, end), earliest first.
+        after is the (due date, task_id) of the last task of the previous
+        page; limit None returns them all.
+        """
+        with self._lock:
+            first, last = self._bounds(start, end)
+            if after is not None:
+                first = max(first, bisect.bisect_right(self._queue, tuple(after)))
+            if limit is not None:
+                last = min(last, first + limit)
+            return self._queue[first:last]
+
+    def count_due(self, start=None, end=None) -> int:
+        """Number of tasks due in [start, end)."""
+        with self._lock:
+            first, last = self._bounds(start, end)
+            return max(0, last - first)
+
+    def next_due(self, limit):
+        """The `limit` open tasks due first, overdue ones included."""
+        return self.due(limit=limit)
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+from task_repository import get_repository
+
+### SELECTION OF TASKS ON THE DELETE PAGE ###
+# The selection is kept apart from the (cached) task data, as a base set
+# plus two small sets of exceptions:
+#   base     sorted array of the task_ids picked by the last select all /
+#            invert / select-by-status click
+#   added    task_ids ticked on top of the base
+#   removed  task_ids of the base that were unticked
+# The base is resolved to task_ids when it is set, from the tasks matching
+# the page's search and filters at that moment: tasks that other sessions
+# add or complete afterwards are never deleted by a click made before.
+# Ticking a row only puts it in added or removed when that differs from the
+# base, so replaying the editor's edits is harmless.
+
+STATUS_FILTERS = {'all': None, 'completed': True, 'pending': False}
+
+_NO_TASKS = np.empty(0, dtype=np.int64)
+
+
+def _id_array(task_ids):
+    return np.unique(np.asarray(task_ids, dtype=np.int64))
+
+
+class TaskSelection:
+
+    def __init__(self):
+        self.base = _NO_TASKS
+        self.added = set()
+        self.removed = set()
+        # bumped whenever the whole selection changes, so the data editor
+        # can be given a fresh key and drop its own checkbox state
+        self.generation = 0
+
+    def _reset(self, base):
+        self.base = base
+        self.added = set()
+        self.removed = set()
+        self.generation += 1
+
+    def _in_base(self, task_id):
+        position = np.searchsorted(self.base, task_id)
+        return position < len(self.base) and self.base[position] == task_id
+
+    ### Whole-selection operations ###
+    # db_path, search and task_filter are those of the table on screen. The
+    # repository is looked up on the click: these run as button callbacks,
+    # and the shard may have been closed and reopened since the render.
+    def select_all(self, db_path, search='', task_filter=None):
+        self._reset(_id_array(get_repository(db_path).select_task_ids(
+            search=search, task_filter=task_filter)))
+
+    def clear(self):
+        self._reset(_NO_TASKS)
+
+    def select_status(self, db_path, completed, search='', task_filter=None):
+        self._reset(_id_array(get_repository(db_path).select_task_ids(completed, search, task_filter)))
+
+    def invert(self, db_path, search='', task_filter=None):
+        # the complement, among the tasks shown, of base + added - removed
+        # is (shown - base) + removed - added
+        shown = _id_array(get_repository(db_path).select_task_ids(search=search, task_filter=task_filter))
+        shown_ids = set(shown.tolist())
+        added, removed = self.removed & shown_ids, self.added & shown_ids
+        self.base = np.setdiff1d(shown, self.base, assume_unique=True)
+        self.added, self.removed = added, removed
+        self.generation += 1
+
+    ### Single rows ###
+    def set(self, task_id, selected):
+        task_id = int(task_id)
+        self.added.discard(task_id)
+        self.removed.discard(task_id)
+        if selected != self._in_base(task_id):
+            (self.added if selected else self.removed).add(task_id)
+
+    ### Reading the selection ###
+    def is_empty(self):
+        return self.count() == 0
+
+    def mask(self, df):
+        """Boolean Series telling which rows of df are selected (vectorized)."""
+        task_ids = df['task_id'].to_numpy()
+        selected = np.isin(task_ids, self.base)
+        if self.added:
+            selected |= np.isin(task_ids, list(self.added))
+        if self.removed:
+            selected &= ~np.isin(task_ids, list(self.removed))
+        return pd.Series(selected, index=df.index)
+
+    def count(self):
+        """Number of selected tasks."""
+        # removed is a subset of the base and added is disjoint from it
+        return len(self.base) - len(self.removed) + len(self.added)
+
+    def task_ids(self):
+        """The list of task_ids to act on."""
+        return sorted((set(self.base.tolist()) - self.removed) | self.added)
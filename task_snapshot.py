@@ -0,0 +1,111 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from debug import timed
+
+# Once the change log grows past this many entries it is trimmed back to
+# CHANGE_LOG_KEEP; snapshots further behind than that do a full reload.
+# The maintenance worker also trims it every round, whether or not any
+# snapshot is in use.
+CHANGE_LOG_MAX = 50_000
+CHANGE_LOG_KEEP = 10_000
+
+
+def _epochs_to_datetimes(column):
+    # Cast the epoch seconds with numpy directly: pd.to_datetime(unit='s')
+    # multiplies floats under np.errstate(over='raise'), which was seen to
+    # raise a spurious FloatingPointError with many sessions loading at once.
+    # NaN (NULL or not a number) casts to NaT.
+    seconds = pd.to_numeric(column, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    return pd.Series(seconds.astype('datetime64[s]').astype('datetime64[ns]'), index=column.index)
+
+
+def convert_task_types(df):
+    """
+    Convert raw task rows to the compact dtypes the pages display and edit:
+    int32 task_id, Arrow-backed strings, bool and datetime64 (UTC, naive).
+    Dates are stored as Unix epochs, so no string is parsed here.
+    """
+    with timed('dtype conversion'):
+        df['task_id'] = df['task_id'].astype('int32')
+        df['task'] = df['task'].astype('string[pyarrow]')
+        df['completed'] = df['completed'].astype(bool)
+        # NULL dates (and anything that is not an epoch, e.g. text written by
+        # an external tool) become NaT (Not a Time)
+        df['created_date'] = _epochs_to_datetimes(df['created_date'])
+        df['completed_date'] = _epochs_to_datetimes(df['completed_date'])
+        df['due_date'] = _epochs_to_datetimes(df['due_date'])
+        df['recurrence'] = df['recurrence'].astype('string[pyarrow]')
+    return df
+
+
+def _index_by_task_id(df):
+    # an unnamed index, so 'task_id' stays unambiguous as a column to sort by
+    df.index = df['task_id'].to_numpy()
+    return df
+
+
+class TaskSnapshot:
+    """
+    In-memory copy of the whole tasks table kept current incrementally.
+    The first sync reads the full table; later syncs only read the tasks
+    logged in task_changes after the snapshot's high-water mark and patch
+    them in, so a write of one task costs one row read instead of a reload.
+    """
+
+    def __init__(self, repository):
+        self.repository = repository
+        self.df = None
+        self.change_id = 0
+        self._last_trim = 0
+        self._lock = threading.Lock()
+
+    def sync(self):
+        """Bring the snapshot up to date and return a copy of it."""
+        with self._lock, timed('snapshot sync'):
+            if self.df is None:
+                self._full_reload()
+            elif self.repository.last_change_id() != self.change_id:
+                changes = self.repository.read_changes(self.change_id)
+                if changes is None:
+                    self._full_reload()
+                else:
+                    self._apply_changes(*changes)
+            self._trim_change_log()
+            # callers add columns and edit the frame they get back, and the
+            # data editor reports edits by row position
+            return self.df.reset_index(drop=True)
+
+    def _full_reload(self):
+        df, self.change_id = self.repository.read_all_with_change_id()
+        self.df = _index_by_task_id(convert_task_types(df))
+
+    def _apply_changes(self, changed_ids, rows, change_id):
+        df = self.df
+        rows = (_index_by_task_id(convert_task_types(rows))
+                if rows is not None else df.iloc[:0])
+
+        present = df.index.intersection(rows.index)
+        inserted = rows.index.difference(df.index)
+        deleted = df.index.intersection(changed_ids).difference(rows.index)
+
+        # updated rows are patched in place; only inserts change the order
+        if len(present):
+            df.loc[present, rows.columns] = rows.loc[present]
+        if len(deleted):
+            df = df.drop(deleted)
+        if len(inserted):
+            df = pd.concat([rows.loc[inserted], df])
+            df = df.sort_values(['created_date', 'task_id'], ascending=False)
+
+        self.df = df
+        self.change_id = change_id
+
+    def _trim_change_log(self):
+        # change_ids only grow, so at most CHANGE_LOG_MAX entries have been
+        # logged since the last trim
+        if self.change_id - self._last_trim >= CHANGE_LOG_MAX:
+            self.repository.prune_change_log(CHANGE_LOG_KEEP)
+            self._last_trim = self.change_id
@@ -0,0 +1,30 @@
+import pytest
+
+import db_path
+import task_repository
+from task_repository import TaskRepository
+
+
+@pytest.fixture
+def repository(tmp_path):
+    """A repository on a new, empty database."""
+    repository = TaskRepository(str(tmp_path / 'tasks.db'))
+    yield repository
+    repository.close()
+
+
+@pytest.fixture
+def tenants_dir(tmp_path, monkeypatch):
+    """
+    A new, empty directory of tenant shards. The shards opened through
+    get_repository() meanwhile are closed afterwards, as if evicted.
+    """
+    tenants_dir = tmp_path / 'tenants'
+    monkeypatch.setattr(db_path, 'TENANTS_DIR', str(tenants_dir))
+    yield tenants_dir
+    for path in [path for path in task_repository._repositories if path.startswith(str(tenants_dir))]:
+        repository = task_repository._repositories.pop(path)
+        task_repository._last_used.pop(path, None)
+        for closer in task_repository._shard_closers:
+            closer(path, repository)
+        repository.close()
@@ -0,0 +1,127 @@
+"""Validation of what API clients send: cursors, IDs and the fields of writes."""
+import base64
+import http.client
+import json
+import threading
+
+import pytest
+
+from task_api import APIError, decode_cursor, encode_cursor, make_server
+
+
+@pytest.fixture
+def api(tenants_dir):
+    """Send a request to a live API server; returns (status, decoded JSON body)."""
+    server = make_server(port=0)
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05},
+                     daemon=True).start()
+
+    def request(method, path, body=None, headers=None):
+        conn = http.client.HTTPConnection(*server.server_address, timeout=10)
+        data = body if isinstance(body, bytes) or body is None else json.dumps(body).encode()
+        conn.request(method, path, data, {'X-Tenant': 'team-a', **(headers or {})})
+        response = conn.getresponse()
+        status, content = response.status, response.read()
+        conn.close()
+        return status, json.loads(content) if content else None
+
+    yield request
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def tasks(api):
+    assert api('POST', '/tasks', {'tasks': ['write report', 'buy milk', 'call the bank']}) == (
+        201, {'task_ids': [1, 2, 3]})
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+@pytest.mark.parametrize('cursor', [(1717000000, 12), ('buy milk', 3), (-1.5, 7), (None, 2)])
+def test_decodes_its_own_cursors(cursor):
+    assert decode_cursor(encode_cursor(cursor)) == cursor
+
+
+@pytest.mark.parametrize('value', [
+    'not base64!', raw_cursor(None), raw_cursor(5), raw_cursor([1]), raw_cursor([1, 2, 3]),
+    raw_cursor([[1], 2]), raw_cursor([{'a': 1}, 2]), raw_cursor([1, '2']), raw_cursor([1, 2.0]),
+    raw_cursor([1, True]), raw_cursor([2 ** 63, 1]), raw_cursor([1, -2 ** 63 - 1]),
+])
+def test_rejects_invalid_cursors(value):
+    with pytest.raises(APIError) as error:
+        decode_cursor(value)
+    assert error.value.status == 400
+
+
+def test_invalid_cursor_is_a_bad_request(api, tasks):
+    assert api('GET', '/tasks?cursor=' + raw_cursor([[1], 2]))[0] == 400
+
+
+def test_pages_follow_the_cursor(api, tasks):
+    status, page = api('GET', '/tasks?limit=2')
+    assert status == 200 and len(page['tasks']) == 2
+    status, rest = api('GET', f"/tasks?limit=2&cursor={page['next_cursor']}")
+    assert [task['task_id'] for task in page['tasks'] + rest['tasks']] == [3, 2, 1]
+    assert rest['next_cursor'] is None
+
+
+@pytest.mark.parametrize('changes, failure', [
+    ({'completed': 'false'}, 'completed must be true or false'),
+    ({'completed': 0}, 'completed must be true or false'),
+    ({'completed': None}, 'completed must be true or false'),
+    ({'task': ['x']}, 'task must be a string'),
+    ({'task': 5}, 'task must be a string'),
+])
+def test_update_fields_are_not_coerced(api, tasks, changes, failure):
+    assert api('PATCH', '/tasks/2', changes) == (
+        422, {'error': 'no task was updated', 'failures': {'0': failure}})
+    status, task = api('GET', '/tasks/2')
+    assert (task['task'], task['completed']) == ('buy milk', False)
+
+
+@pytest.mark.parametrize('task_id', ['abc', True, 1.0, None, 2 ** 63])
+def test_batch_update_ids_must_be_integers(api, tasks, task_id):
+    updates = [{'task_id': 1, 'completed': True}, {'task_id': task_id, 'completed': True}]
+    assert api('PATCH', '/tasks', {'updates': updates}) == (
+        422, {'error': 'no task was updated', 'failures': {'1': 'task_id must be an integer'}})
+    assert api('GET', '/tasks/1')[1]['completed'] is False
+
+
+def test_valid_updates_are_applied(api, tasks):
+    assert api('PATCH', '/tasks/2', {'task': 'buy oat milk', 'completed': True})[0] == 200
+    status, task = api('GET', '/tasks/2')
+    assert (task['task'], task['completed']) == ('buy oat milk', True)
+
+
+@pytest.mark.parametrize('body', [{'task_ids': [True]}, {'task_ids': ['1']}, {'task_ids': [2 ** 63]},
+                                  {'task_ids': 1}])
+def test_deleted_ids_must_be_integers(api, tasks, body):
+    assert api('POST', '/tasks/delete', body)[0] == 400
+    assert api('GET', '/tasks/1')[0] == 200
+
+
+@pytest.mark.parametrize('soft', ['false', 0, None])
+def test_soft_must_be_a_boolean(api, tasks, soft):
+    assert api('POST', '/tasks/delete', {'task_ids': [1], 'soft': soft})[0] == 422
+    assert api('GET', '/tasks/1')[0] == 200
+
+
+def test_deletes(api, tasks):
+    assert api('POST', '/tasks/delete', {'task_ids': [1], 'soft': True}) == (200, {'deleted': 1})
+    assert api('DELETE', '/tasks/2')[0] == 204
+    assert api('GET', '/tasks/1')[0] == 404
+    assert api('GET', '/tasks/2')[0] == 404
+
+
+@pytest.mark.parametrize('method', ['GET', 'DELETE', 'PATCH'])
+def test_out_of_range_id_is_not_found(api, tasks, method):
+    body = {'task': 'x'} if method == 'PATCH' else None
+    assert api(method, '/tasks/99999999999999999999999', body)[0] == 404
+
+
+@pytest.mark.parametrize('length', ['abc', '-5'])
+def test_invalid_content_length_is_a_bad_request(api, length):
+    assert api('POST', '/tasks', b'{}', {'Content-Length': length})[0] == 400
@@ -0,0 +1,103 @@
+"""
+Migrating a database made by the original create_db.py: creation_date
+column, 'YYYY-MM-DD HH:MM:SS' text dates and the odd unparseable one.
+"""
+import calendar
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from migrations import LATEST_VERSION, migrate, schema_version
+from task_repository import TaskRepository
+
+# The schema of create_db.py before any migration existed
+BASELINE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task TEXT NOT NULL,
+    creation_date TEXT DEFAULT CURRENT_TIMESTAMP,
+    completed_date TEXT,
+    completed INTEGER DEFAULT 0
+)
+'''
+
+BASELINE_TASKS = [
+    (1, 'write report', '2024-01-02 10:00:00', None, 0),
+    (2, 'buy milk', '2024-01-02 12:30:00', '2024-01-03 09:00:00', 1),
+    (3, 'old note', 'garbage', None, 0),
+    (4, 'call the bank', '2024-01-05 08:00:00', '2024-01-06 18:00:00', 1),
+    (5, 'deleted before the upgrade', '2024-01-07 08:00:00', None, 0),
+]
+
+
+def epoch(text):
+    return calendar.timegm(datetime.fromisoformat(text).timetuple())
+
+
+@pytest.fixture
+def repository(tmp_path):
+    db_path = str(tmp_path / 'tasks.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute(BASELINE_SCHEMA)
+    conn.executemany('INSERT INTO tasks VALUES (?, ?, ?, ?, ?)', BASELINE_TASKS)
+    conn.execute('DELETE FROM tasks WHERE task_id = 5')
+    conn.commit()
+    conn.close()
+
+    repository = TaskRepository(db_path)
+    yield repository
+    repository.close()
+
+
+def test_migrates_to_latest_version(repository):
+    assert len(repository.migrations_applied) == LATEST_VERSION
+    with repository.connection() as conn:
+        assert schema_version(conn) == LATEST_VERSION
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(tasks)')]
+        # running it again is a no-op
+        assert migrate(conn) == []
+    assert 'creation_date' not in columns
+    assert {'created_date', 'deleted_at', 'due_date', 'recurrence'} <= set(columns)
+
+
+def test_keeps_rows_and_converts_dates(repository):
+    with repository.connection() as conn:
+        rows = conn.execute('''
+        SELECT task_id, task, created_date, completed_date, completed, deleted_at, due_date
+        FROM tasks ORDER BY task_id
+        ''').fetchall()
+    assert rows == [
+        (1, 'write report', epoch('2024-01-02 10:00:00'), None, 0, None, None),
+        (2, 'buy milk', epoch('2024-01-02 12:30:00'), epoch('2024-01-03 09:00:00'), 1, None, None),
+        # dates that cannot be parsed become NULL
+        (3, 'old note', None, None, 0, None, None),
+        (4, 'call the bank', epoch('2024-01-05 08:00:00'), epoch('2024-01-06 18:00:00'), 1, None, None),
+    ]
+
+
+def test_does_not_reuse_deleted_ids(repository):
+    assert repository.create_task('new task') == 6
+
+
+def test_backfills_statistics(repository):
+    assert tuple(repository.task_totals()) == (4, 2)
+    stats = repository.daily_stats('2024-01-01', '2024-01-31')
+    assert stats[['day', 'created', 'completed']].values.tolist() == [
+        ['2024-01-02', 2, 0],
+        ['2024-01-03', 0, 1],
+        ['2024-01-05', 1, 0],
+        ['2024-01-06', 0, 1],
+    ]
+
+
+@pytest.mark.parametrize('page_size', [1, 2, 3, None])
+def test_pages_reach_tasks_without_a_date(repository, page_size):
+    task_ids, after = [], None
+    while True:
+        page, after = repository.read_page(page_size, after)
+        task_ids += page['task_id'].tolist()
+        if after is None:
+            break
+    # newest first, the undated task last
+    assert task_ids == [4, 2, 1, 3]
@@ -0,0 +1,63 @@
+"""The next-due queue against the same questions asked in SQL."""
+import random
+from datetime import date
+
+import pytest
+
+from task_scheduler import TaskScheduler, day_epoch, due_windows
+
+TODAY = date(2024, 6, 15)
+DAY = 24 * 3600
+
+
+def due_in_sql(repository, start, end):
+    with repository.connection() as conn:
+        return conn.execute('''
+        SELECT due_date, task_id FROM tasks
+        WHERE deleted_at IS NULL AND completed = 0 AND due_date IS NOT NULL
+          AND due_date >= ? AND due_date < ?
+        ORDER BY due_date, task_id
+        ''', (-2 ** 62 if start is None else start, 2 ** 62 if end is None else end)).fetchall()
+
+
+@pytest.fixture
+def scheduler(repository):
+    rng = random.Random(7)
+    today = day_epoch(TODAY)
+    for i in range(300):
+        # a large overdue backlog, some due today and some later
+        repository.create_task(f'task {i}', today + rng.randint(-60, 20) * DAY)
+    repository.create_task('no due date')
+    return TaskScheduler(repository).sync()
+
+
+def check_windows(repository, scheduler):
+    for start, end in due_windows(TODAY).values():
+        expected = due_in_sql(repository, start, end)
+        assert scheduler.count_due(start, end) == len(expected)
+        assert scheduler.due(start, end) == expected
+        pages, after = [], None
+        while page := scheduler.due(start, end, limit=7, after=after):
+            pages += page
+            after = page[-1]
+        assert pages == expected
+
+
+def test_windows_match_sql(repository, scheduler):
+    check_windows(repository, scheduler)
+    assert scheduler.next_due(3) == due_in_sql(repository, None, None)[:3]
+
+
+def test_follows_changes(repository, scheduler):
+    with repository.connection() as conn:
+        conn.execute('UPDATE tasks SET completed = 1 WHERE task_id % 7 = 0')
+        conn.execute(f'UPDATE tasks SET due_date = due_date + {DAY} WHERE task_id % 5 = 0')
+        conn.execute('UPDATE tasks SET due_date = NULL WHERE task_id % 11 = 0')
+        conn.execute('UPDATE tasks SET deleted_at = 1 WHERE task_id % 13 = 0')
+        conn.execute('DELETE FROM tasks WHERE task_id % 17 = 0')
+        conn.commit()
+    repository.create_task('due today', day_epoch(TODAY) + 3600)
+    scheduler.sync()
+    check_windows(repository, scheduler)
+    reloaded = TaskScheduler(repository).sync()
+    assert scheduler.due() == reloaded.due()
@@ -0,0 +1,60 @@
+"""Tenant shards: created on the first write, closed once idle beyond the limit."""
+import os
+
+import pytest
+
+import task_repository
+from db_path import tenant_db_path
+from task_repository import get_repository
+from write_queue import get_write_queue
+
+
+@pytest.fixture
+def shards(tenants_dir, monkeypatch):
+    monkeypatch.setattr(task_repository, 'MAX_OPEN_SHARDS', 2)
+
+    def open_shards(*tenants):
+        return [get_repository(tenant_db_path(tenant)) for tenant in tenants]
+    return open_shards
+
+
+def is_open(repository):
+    return task_repository._repositories.get(repository.db_path) is repository and not repository.closed
+
+
+def test_reading_does_not_create_a_shard(tenants_dir):
+    db_path = tenant_db_path('team-a')
+    assert get_repository(db_path, create=False) is None
+    assert not os.path.exists(db_path)
+    assert db_path not in task_repository._repositories
+
+    repository = get_repository(db_path)
+    assert os.path.exists(db_path)
+    assert get_repository(db_path, create=False) is repository
+
+
+def test_idle_shards_beyond_the_limit_are_closed(shards, monkeypatch):
+    monkeypatch.setattr(task_repository, 'SHARD_IDLE_SECONDS', 0)
+    a, b = shards('team-a', 'team-b')
+    write_queue = get_write_queue(a.db_path)
+    assert write_queue.create_task('kept').result(5) == 1
+
+    # team-a is used again, so team-b is now the least recently used
+    get_repository(a.db_path)
+    c, = shards('team-c')
+    assert [is_open(shard) for shard in (a, b, c)] == [True, False, True]
+
+    d, = shards('team-d')
+    assert [is_open(shard) for shard in (a, c, d)] == [False, True, True]
+    # closed with its write queue, and reopened on the next use
+    with pytest.raises(RuntimeError, match='closed'):
+        write_queue.create_task('too late').result(5)
+    reopened = get_write_queue(a.db_path)
+    assert reopened is not write_queue and reopened.repository.count_tasks() == 1
+
+
+def test_shards_in_use_are_not_closed(shards, monkeypatch):
+    monkeypatch.setattr(task_repository, 'SHARD_IDLE_SECONDS', 3600)
+    opened = shards('team-a', 'team-b', 'team-c', 'team-d')
+    # busy shards can outnumber the limit until they are idle
+    assert all(is_open(shard) for shard in opened)
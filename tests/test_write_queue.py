@@ -0,0 +1,111 @@
+"""Group commit: one savepoint per write, one commit per deleted or imported chunk."""
+import io
+import threading
+
+import pytest
+
+from bulk_io import CHUNK_SIZE, import_tasks
+from task_repository import MAX_SQL_PARAMS, insert_task, insert_tasks
+from write_queue import WriteQueue
+
+
+class RecordingWriteQueue(WriteQueue):
+    """A write queue that keeps the operations of every batch it commits."""
+
+    def __init__(self, repository):
+        self.batches = []
+        super().__init__(repository)
+
+    def _commit(self, batch):
+        self.batches.append([operation.__name__ for _, operation, _ in batch])
+        super()._commit(batch)
+
+
+@pytest.fixture
+def write_queue(repository):
+    write_queue = RecordingWriteQueue(repository)
+    yield write_queue
+    write_queue.close()
+
+
+def task_names(repository):
+    with repository.connection() as conn:
+        return [task for (task,) in conn.execute('SELECT task FROM tasks ORDER BY task_id')]
+
+
+def test_a_failing_write_does_not_affect_its_batch(repository, write_queue):
+    # hold the writer, so the next writes are committed together
+    holding, release = threading.Event(), threading.Event()
+
+    def hold(conn):
+        holding.set()
+        release.wait(5)
+
+    write_queue.submit(hold)
+    holding.wait(5)
+
+    def insert_then_fail(conn):
+        insert_task(conn, 'rolled back')
+        raise ValueError('bad write')
+
+    before = write_queue.create_task('before')
+    failing = write_queue.submit(insert_then_fail)
+    after = write_queue.create_tasks(['after 1', 'after 2'])
+    release.set()
+
+    assert before.result(5) == 1
+    with pytest.raises(ValueError, match='bad write'):
+        failing.result(5)
+    assert after.result(5) == 2
+    assert write_queue.batches[1] == ['insert_task', 'insert_then_fail', 'insert_tasks']
+    assert task_names(repository) == ['before', 'after 1', 'after 2']
+
+
+def test_deletes_commit_one_chunk_per_batch(repository, write_queue):
+    tasks = 2 * MAX_SQL_PARAMS + 250
+    repository.create_tasks([f'task {i}' for i in range(tasks)])
+
+    assert write_queue.delete_tasks(range(1, tasks + 1), soft=True).result(5) == tasks
+    assert [batch.count('remove_tasks') for batch in write_queue.batches] == [1, 1, 1]
+    assert repository.count_tasks() == 0
+
+
+def test_a_delete_lets_other_writes_in_between_chunks(repository, write_queue):
+    tasks = 3 * MAX_SQL_PARAMS
+    repository.create_tasks([f'task {i}' for i in range(tasks)])
+
+    deleted = write_queue.delete_tasks(range(1, tasks + 1))
+    created = [write_queue.create_task(f'new {i}') for i in range(3)]
+    assert deleted.result(5) == tasks
+    assert [future.result(5) for future in created] == [tasks + 1, tasks + 2, tasks + 3]
+    # the first chunk's batch can already hold the new tasks
+    assert sum(1 for batch in write_queue.batches if 'remove_tasks' in batch) == 3
+    assert task_names(repository) == ['new 0', 'new 1', 'new 2']
+
+
+def test_closed_queue_refuses_writes(write_queue):
+    write_queue.close()
+    with pytest.raises(RuntimeError, match='closed'):
+        write_queue.create_task('too late').result(5)
+
+
+def csv_file(rows):
+    return io.BytesIO(('task,completed\n' + ''.join(f'{task},{completed}\n' for task, completed in rows))
+                      .encode())
+
+
+def test_imports_one_chunk_per_commit(repository, write_queue):
+    rows = [(f'task {i}', i % 2) for i in range(2 * CHUNK_SIZE + 10)]
+    progress = []
+    assert import_tasks(csv_file(rows), 'csv', progress.append, write_queue) == len(rows)
+    assert progress == [CHUNK_SIZE, 2 * CHUNK_SIZE, len(rows)]
+    assert write_queue.batches == [['insert_imported']] * 3
+    assert tuple(repository.task_totals()) == (len(rows), CHUNK_SIZE + 5)
+
+
+def test_an_invalid_import_adds_nothing(repository, write_queue):
+    rows = [(f'task {i}', 0) for i in range(CHUNK_SIZE + 10)] + [('', 0)]
+    with pytest.raises(ValueError):
+        import_tasks(csv_file(rows), 'csv', write_queue=write_queue)
+    assert write_queue.batches == []
+    assert repository.count_tasks() == 0
@@ -0,0 +1,193 @@
+"""
+Single-writer queue with group commit for task writes.
+
+SQLite lets one connection write at a time, so sessions writing at once
+used to queue up on the database lock and could give up with "database is
+locked". Instead, pages submit their writes to one background writer
+thread per database. It takes every write waiting in the queue, runs them
+in one transaction (one commit, one fsync) and hands each caller its own
+result through a Future:
+
+    task_id = get_write_queue().create_task('Buy milk').result()
+
+Each write runs inside its own savepoint, so a write that fails is rolled
+back and reported to its caller without affecting the others in the batch.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+
+from db_path import DB_PATH
+from task_repository import (_chunks, apply_updates, get_repository, insert_imported,
+                             insert_task, insert_tasks, on_shard_closed, remove_tasks)
+
+# Most writes committed together in one transaction
+MAX_BATCH_WRITES = 200
+
+# How long a page waits for its write before giving up
+WRITE_TIMEOUT = 30
+
+
+class WriteQueue:
+    """
+    Background writer for one database. submit() queues operation(conn, *args)
+    and returns a Future with its return value (or its exception), set once
+    the transaction it ran in is committed.
+    """
+
+    def __init__(self, repository, max_batch=MAX_BATCH_WRITES):
+        self.repository = repository
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='task-write-queue', daemon=True)
+        self._thread.start()
+
+    def submit(self, operation, *args) -> Future:
+        future = Future()
+        with self._lock:
+            if self._closed:
+                future.set_exception(RuntimeError('the write queue is closed'))
+            else:
+                self._queue.put((future, operation, args))
+        return future
+
+    ### Task writes ###
+    def create_task(self, task, due_date=None, recurrence=None):
+        return self.submit(insert_task, task, due_date, recurrence)
+
+    def create_tasks(self, tasks):
+        return self.submit(insert_tasks, tasks)
+
+    def import_tasks(self, rows):
+        return self.submit(insert_imported, rows)
+
+    def update_tasks(self, updates):
+        return self.submit(apply_updates, updates)
+
+    def delete_tasks(self, task_ids, soft=False):
+        """
+        Delete the tasks one chunk of MAX_SQL_PARAMS at a time, like
+        TaskRepository.delete_tasks(). A chunk is only queued once the one
+        before it is committed, so every chunk commits in its own batch and
+        a huge selection never holds the writer for long. The Future holds
+        the total number of rows deleted; if a chunk fails, the chunks
+        before it stay deleted.
+        """
+        chunks = list(_chunks([int(task_id) for task_id in task_ids]))
+        total = Future()
+        deleted = 0
+
+        def queue_chunk(index):
+            self.submit(remove_tasks, chunks[index], soft).add_done_callback(
+                lambda future: chunk_done(index, future))
+
+        def chunk_done(index, future):
+            nonlocal deleted
+            if future.exception() is not None:
+                total.set_exception(future.exception())
+                return
+            deleted += future.result()
+            if index + 1 < len(chunks):
+                queue_chunk(index + 1)
+            else:
+                total.set_result(deleted)
+
+        if chunks:
+            queue_chunk(0)
+        else:
+            total.set_result(0)
+        return total
+
+    def close(self):
+        """
+        Stop the writer once the writes already queued are committed. Writes
+        submitted afterwards fail with RuntimeError.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    ### Writer thread ###
+    def _run(self):
+        while True:
+            # block for the first write, then take whatever else is waiting
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            batch = [item for item in batch
+                     if item is not None and item[0].set_running_or_notify_cancel()]
+            if batch:
+                self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch):
+        outcomes = []
+        try:
+            with self.repository.transaction() as conn:
+                # take the write lock up front, and keep the savepoints below
+                # nested in this transaction instead of committing on release
+                conn.execute('BEGIN IMMEDIATE')
+                for future, operation, args in batch:
+                    conn.execute('SAVEPOINT write')
+                    try:
+                        result = operation(conn, *args)
+                    except Exception as e:
+                        conn.execute('ROLLBACK TO write')
+                        conn.execute('RELEASE write')
+                        outcomes.append((future, None, e))
+                    else:
+                        conn.execute('RELEASE write')
+                        outcomes.append((future, result, None))
+        except Exception as e:
+            # the commit itself failed: nothing in the batch was written
+            for future, _, _ in batch:
+                future.set_exception(e)
+            return
+
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+### PROCESS-WIDE WRITE QUEUES ###
+_write_queues = {}
+_write_queues_lock = threading.Lock()
+
+def get_write_queue(db_path=DB_PATH) -> WriteQueue:
+    """Return the shared write queue for db_path, starting it on first use."""
+    # looked up first: opening a shard can close an idle one, whose closer
+    # below takes the lock
+    repository = get_repository(db_path)
+    with _write_queues_lock:
+        write_queue = stale = _write_queues.get(db_path)
+        if write_queue is None or write_queue.repository is not repository:
+            # a shard reopened while its old queue was being closed
+            write_queue = _write_queues[db_path] = WriteQueue(repository)
+        else:
+            stale = None
+    if stale is not None:
+        stale.close()
+    return write_queue
+
+def _close_write_queue(db_path, repository):
+    with _write_queues_lock:
+        write_queue = _write_queues.get(db_path)
+        if write_queue is None or write_queue.repository is not repository:
+            return
+        del _write_queues[db_path]
+    write_queue.close()
+
+on_shard_closed(_close_write_queue)